@@ -4,14 +4,10 @@ Main Streamlit application file.
 This should be run directly with: streamlit run app.py
 """
 
+import functools
 import sys
 import os
 import streamlit as st
-import pandas as pd
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-import requests
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,80 +16,208 @@ load_dotenv()
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+# Heavy dependencies (FAISS, NumPy, pandas, requests) are imported where they are
+# first used, so the page renders while the model warms up in the background
+from src.models.onnx_backend import load_sentence_transformer, parse_model_spec
+from src.models.query_cache import QueryCache
+from src.utils.metrics import stage_summary, timed
+from src.utils.warmup import start_warmup
+
 # Configuration
 class Settings:
     SERPAPI_KEY = os.getenv("SERPAPI_KEY", "********")  # Replace with your actual SerpAPI key
     KB_DATA_PATH = os.getenv("KB_DATA_PATH", "kb_data/sap_kb.xlsx")
+    INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", ".cache/index")
+    INDEX_CACHE_KEEP = int(os.getenv("INDEX_CACHE_KEEP", "3"))  # newest index builds kept on disk, 0 keeps all
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "false").lower() == "true"  # share the cached index between workers
+    INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")  # one of APP_INDEX_TYPES
+    RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+    KB_BATCH_ROWS = int(os.getenv("KB_BATCH_ROWS", "5000"))
+    EMBED_CHECKPOINT_DIR = os.getenv("EMBED_CHECKPOINT_DIR", ".cache/embed")  # finished shards of interrupted builds
+    EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))  # processes encoding the KB, each with its own model
+    EMBED_SHARD_ROWS = int(os.getenv("EMBED_SHARD_ROWS", "2048"))
+    EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # threads per worker, 0 = cores / workers
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, onnx, onnx-int8
+    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.65"))  # minimum confidence, 0-1
+    CALIBRATION_PATH = os.getenv("CALIBRATION_PATH", ".cache/calibration.json")
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))
     APP_TITLE = "SAP Intelligent Support Assistant (SLM + RAG)"
     APP_DESCRIPTION = "Built with RAG-powered SAP SLM. For internal and external issue resolution."
 
 settings = Settings()
 
-# Utility functions
-@st.cache_data
-def load_kb(filepath):
-    """Load knowledge base from Excel file."""
-    try:
-        df = pd.read_excel(filepath)
-        df = df.dropna(subset=['Note Title', 'Description'])
-        df['combined_text'] = df['Note Title'] + ". " + df['Description']
-        return df
-    except Exception as e:
-        st.error(f"Error loading knowledge base: {str(e)}")
-        return None
+# Index types searched without tuning: exact flat, or compact codes rescored exactly.
+# ANN types (ivf, hnsw, ivf_pq) need the search parameters SearchEngine tunes; use src/main.py.
+APP_INDEX_TYPES = ("flat", "sq8", "fp16")
 
+# Utility functions
 @st.cache_resource
+def warm_up_model():
+    """Start loading the embedding model in the background, overlapping the index load."""
+    return start_warmup(
+        lambda: load_sentence_transformer(*parse_model_spec(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND))
+    )
+
 def load_embedding_model():
-    """Load the embedding model."""
+    """Wait for the embedding model."""
     try:
-        return SentenceTransformer(settings.EMBEDDING_MODEL)
+        return warm_up_model().result()
     except Exception as e:
+        warm_up_model.clear()  # retry on the next rerun
         st.error(f"Error loading embedding model: {str(e)}")
         return None
 
-@st.cache_data
-def get_kb_embeddings(kb_texts):
-    """Get embeddings for knowledge base texts with caching."""
+class KBEncoder:
+    """The warmed-up model in the form ``ShardedEmbedder`` encodes with; workers load their own copy."""
+    
+    def __init__(self, model):
+        self.model = model
+        self.model_name, self.backend = parse_model_spec(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND)
+        self.cache_id = self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+    
+    def worker_factory(self):
+        return functools.partial(load_sentence_transformer, self.model_name, self.backend)
+    
+    def encode(self, texts):
+        return self.model.encode(texts)
+
+def embed_kb(filepath):
+    """Stream the knowledge base in batches into checkpointed shards, encoded by EMBED_WORKERS processes."""
+    import faiss
+    import numpy as np
+    from src.models.sharded_embedder import ShardedEmbedder
+    from src.utils.data_loader import iter_kb
+    
     model = load_embedding_model()
     if model is None:
-        return None
-    return model.encode(kb_texts)
+        return None, None
+    embedder = ShardedEmbedder(KBEncoder(model), workers=settings.EMBED_WORKERS,
+                               shard_rows=settings.EMBED_SHARD_ROWS, threads=settings.EMBED_THREADS,
+                               checkpoint_dir=settings.EMBED_CHECKPOINT_DIR)
+    kb_texts = []
+    try:
+        for batch in iter_kb(filepath, settings.KB_BATCH_ROWS):
+            texts = batch['combined_text'].tolist()
+            embedder.add(texts)
+            kb_texts.extend(texts)
+        vectors = embedder.finish()
+    except Exception as e:
+        st.error(f"Error loading knowledge base: {str(e)}")
+        return None, None
+    finally:
+        embedder.close()
+    if vectors is None:
+        st.error("Knowledge base is empty")
+        return None, None
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    embedder.cleanup()
+    return vectors, kb_texts
+
+def build_search_index(kb_embeddings):
+    """Build an inner-product (cosine) FAISS index over normalized embeddings."""
+    import numpy as np
+    from src.models.index_factory import build_ann_index
+    
+    return build_ann_index(kb_embeddings, np.arange(len(kb_embeddings), dtype="int64"),
+                           settings.INDEX_TYPE, metric="cosine")
+
+def compact_index():
+    """Whether search rescores candidates of a reduced-precision index from the stored embeddings."""
+    from src.models.index_factory import COMPACT_INDEX_TYPES
+    
+    return settings.INDEX_TYPE in COMPACT_INDEX_TYPES and settings.RESCORE_FACTOR > 1
+
+@st.cache_resource
+def load_search_artifacts(kb_path, cache_key):
+    """Load index, embeddings and texts from the on-disk cache, building them on a miss."""
+    from src.models.index_store import IndexStore, TextTable, pack_texts
+    
+    store = IndexStore(settings.INDEX_CACHE_DIR, keep=settings.INDEX_CACHE_KEEP)
+    cached = store.load(cache_key, mmap=settings.INDEX_MMAP)
+    if cached is None:
+        # One worker builds; others starting at the same time wait and load its result
+        with store.build_lock(cache_key):
+            cached = store.load(cache_key, mmap=settings.INDEX_MMAP)
+            if cached is None:
+                kb_embeddings, kb_texts = embed_kb(kb_path)
+                if kb_embeddings is None:
+                    return None
+                index = build_search_index(kb_embeddings)
+                text_data, text_offsets = pack_texts(kb_texts)
+                store.save(cache_key, index,
+                           {"embeddings": kb_embeddings, "text_data": text_data, "text_offsets": text_offsets})
+                # Reload so embeddings and texts are read from the mapped files instead of held in memory
+                del index, kb_embeddings, kb_texts, text_data, text_offsets
+                cached = store.load(cache_key, mmap=settings.INDEX_MMAP)
+    return cached.index, cached.arrays["embeddings"], TextTable(cached.arrays["text_data"], cached.arrays["text_offsets"])
+
+@st.cache_resource
+def get_cache_key(kb_path, mtime_ns, size, model_id):
+    """Hash the KB once per file version; reruns with the same mtime and size reuse the key."""
+    from src.models.index_store import compute_cache_key
+    from src.utils.data_loader import COMBINED_TEXT_RULE
+    
+    return compute_cache_key(kb_path, model_id, COMBINED_TEXT_RULE, settings.INDEX_TYPE, "cosine")
+
+@st.cache_resource
+def get_query_cache():
+    """Query embedding cache shared across reruns and sessions."""
+    return QueryCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL)
 
 @st.cache_resource
-def build_search_index(_kb_embeddings):
-    """Build FAISS index with caching."""
-    dim = _kb_embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(_kb_embeddings)
-    return index
-
-def get_top_k(query, model, index, kb_texts, k=3, threshold=0.7):
-    """Get top-k similar results."""
-    query_vec = model.encode([query])
-    D, I = index.search(np.array(query_vec), k)
-    results = [(kb_texts[i], D[0][j]) for j, i in enumerate(I[0]) if D[0][j] < threshold]
+def get_calibrator(model_id):
+    """Score-to-confidence mapping fitted with `python -m src.models.calibration`, if any."""
+    from src.models.calibration import ScoreCalibrator, calibration_key
+    from src.utils.data_loader import COMBINED_TEXT_RULE
+    
+    return ScoreCalibrator.load(settings.CALIBRATION_PATH, calibration_key(model_id, "cosine", COMBINED_TEXT_RULE))
+
+def get_top_k(query, model, index, kb_texts, k=3, threshold=0.65, query_cache=None, calibrator=None,
+              embeddings=None):
+    """Get top-k results with confidence of at least ``threshold``.
+    
+    With ``embeddings``, ``RESCORE_FACTOR`` times more candidates are taken
+    from a compact index and rescored exactly.
+    """
+    import faiss
+    import numpy as np
+    from src.models.calibration import ScoreCalibrator
+    from src.models.index_factory import rescore
+    
+    query_vec = query_cache.get(query) if query_cache is not None else None
+    if query_vec is None:
+        with timed("embed_query"):
+            query_vec = np.array(model.encode([query]), dtype="float32")
+        faiss.normalize_L2(query_vec)
+        if query_cache is not None:
+            query_cache.put(query, query_vec)
+    with timed("faiss_search"):
+        if embeddings is None:
+            D, I = index.search(query_vec, k)
+        else:
+            _, I = index.search(query_vec, k * settings.RESCORE_FACTOR)
+            scores, rows = rescore(embeddings, query_vec[0], I[0][I[0] != -1], k, "cosine")
+            D, I = scores.reshape(1, -1), rows.reshape(1, -1)
+    confidence = (calibrator or ScoreCalibrator()).confidence(D[0])
+    results = [(kb_texts[i], float(confidence[j])) for j, i in enumerate(I[0]) if i != -1 and confidence[j] >= threshold]
     return results
 
+@st.cache_resource
+def get_external_searcher():
+    """Pooled, cached SerpAPI client shared across reruns and sessions."""
+    from src.utils.external_search import ExternalSearcher
+    
+    return ExternalSearcher(api_key=settings.SERPAPI_KEY)
+
 def external_rag(query):
     """External search using SerpAPI."""
     if not settings.SERPAPI_KEY:
         return ["External search failed: API key not configured"]
-    
-    try:
-        params = {
-            "engine": "google",
-            "q": query,
-            "api_key": settings.SERPAPI_KEY,
-            "num": 3
-        }
-        response = requests.get("https://serpapi.com/search", params=params)
-        results = response.json().get("organic_results", [])
-        return [f"{res['title']}: {res['link']}" for res in results]
-    except Exception as e:
-        return [f"External search failed: {str(e)}"]
+    return get_external_searcher().search(query, num_results=3)
 
 # Main application
 def main():
@@ -104,6 +228,11 @@ def main():
     )
     
     st.title(settings.APP_TITLE)
+    warm_up_model()
+    
+    if settings.INDEX_TYPE not in APP_INDEX_TYPES:
+        st.error(f"INDEX_TYPE '{settings.INDEX_TYPE}' is not supported here. Expected one of {APP_INDEX_TYPES}")
+        return
     
     # Check if knowledge base exists
     if not os.path.exists(settings.KB_DATA_PATH):
@@ -111,23 +240,18 @@ def main():
         st.info("Please ensure your Excel file is placed in the kb_data/ folder with columns 'Note Title' and 'Description'")
         return
     
-    # Load components
-    kb = load_kb(settings.KB_DATA_PATH)
-    if kb is None:
-        st.error("Failed to load knowledge base. Please check your configuration.")
-        return
-    
-    # Build search index with caching
-    kb_texts = kb['combined_text'].tolist()
-    
-    # Use cached embeddings and index
+    # Load components; a restart with an unchanged KB reuses the on-disk index cache
     with st.spinner("Preparing search system... (this will be fast after first run)"):
-        kb_embeddings = get_kb_embeddings(kb_texts)
-        if kb_embeddings is None:
-            st.error("Failed to generate embeddings.")
+        model_name, backend = parse_model_spec(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND)
+        model_id = model_name if backend == "torch" else f"{model_name}@{backend}"
+        kb_stat = os.stat(settings.KB_DATA_PATH)
+        cache_key = get_cache_key(settings.KB_DATA_PATH, kb_stat.st_mtime_ns, kb_stat.st_size, model_id)
+        artifacts = load_search_artifacts(settings.KB_DATA_PATH, cache_key)
+        if artifacts is None:
+            st.error("Failed to load knowledge base or generate embeddings. Please check your configuration.")
             return
+        index, kb_embeddings, kb_texts = artifacts
         
-        index = build_search_index(kb_embeddings)
         model = load_embedding_model()  # This is cached
         
         if model is None:
@@ -146,13 +270,16 @@ def main():
                 index, 
                 kb_texts, 
                 k=settings.TOP_K_RESULTS, 
-                threshold=settings.SIMILARITY_THRESHOLD
+                threshold=settings.SIMILARITY_THRESHOLD,
+                query_cache=get_query_cache(),
+                calibrator=get_calibrator(model_id),
+                embeddings=kb_embeddings if compact_index() else None
             )
         
         if results:
             st.subheader("🔍 Internal Knowledge Base Results")
-            for i, (text, score) in enumerate(results):
-                confidence = round(1 - score, 2)
+            for i, (text, confidence) in enumerate(results):
+                confidence = round(confidence, 2)
                 with st.expander(f"Result {i+1} - Confidence: {confidence}", expanded=True):
                     st.markdown(text[:500] + "..." if len(text) > 500 else text)
         else:
@@ -168,9 +295,16 @@ def main():
     # Sidebar info
     with st.sidebar:
         st.markdown("### 📊 System Info")
-        st.info(f"Knowledge Base: {len(kb)} entries")
+        st.info(f"Knowledge Base: {len(kb_texts)} entries")
         st.info(f"Model: {settings.EMBEDDING_MODEL}")
         st.info(f"Similarity Threshold: {settings.SIMILARITY_THRESHOLD}")
+        cache_stats = get_query_cache().stats()
+        st.info(f"Query Cache: {cache_stats['size']}/{cache_stats['max_size']} entries, "
+                f"hit rate {cache_stats['hit_rate']:.0%}")
+        stages = stage_summary()
+        if stages:
+            st.markdown("**Stage latency (ms)**")
+            st.table(stages)
         
         st.markdown("### ⚙️ Configuration")
         api_status = "✅ Configured" if settings.SERPAPI_KEY else "❌ Not Configured"
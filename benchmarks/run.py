@@ -0,0 +1,301 @@
+"""
+Search benchmark and retrieval-quality regression suite.
+
+Builds synthetic SAP-style KBs, indexes them with each index type and
+measures build time, resident memory, single-query latency, batch throughput,
+recall@k against exact search and target-note hit rate. The external
+fallback path is timed against a local SerpAPI stub.
+
+Usage:
+    python -m benchmarks.run --sizes 1000,10000,100000 --output bench.json
+    python -m benchmarks.run --sizes 1000000 --types ivf_pq,hnsw
+    python -m benchmarks.run --baseline previous.json   # exit 1 on regressions
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import mmap
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence
+
+import faiss
+import numpy as np
+import pandas as pd
+
+from src.config.settings import settings
+from src.models.calibration import to_similarity
+from src.models.index_factory import INDEX_TYPES, exact_scores
+from src.models.index_report import format_report
+from src.models.search_engine import SearchEngine
+from src.models.search_orchestrator import SearchOrchestrator
+from src.utils.external_search import ExternalSearcher
+from src.utils.response_cache import ResponseCache
+from .synthetic import HashingEmbedder, make_kb, make_miss_queries, make_queries, prepare_kb
+
+# Metrics compared against a baseline: name -> (higher_is_better, absolute tolerance or None)
+TRACKED = {
+    "build_s": (False, None),
+    "p95_ms": (False, None),
+    "p99_ms": (False, None),
+    "batch_qps": (True, None),
+    "recall@k": (True, 0.01),
+    "hit@k": (True, 0.01),
+}
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident set size, or None where /proc is unavailable.
+
+    Peak RSS (``ru_maxrss``) only ever grows within a process, so it cannot
+    tell index types measured one after another apart.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _percentiles(latencies_ms: Sequence[float]) -> Dict[str, float]:
+    return {f"p{p}_ms": round(float(np.percentile(latencies_ms, p)), 3) for p in (50, 95, 99)}
+
+class _StubSerpAPI(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.calls += 1
+        body = json.dumps({"organic_results": [{"title": "SAP Note 1000001", "link": "https://example.com/1"}]})
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+def _dense_recall(engine: SearchEngine, query_vecs: np.ndarray, k: int) -> float:
+    """Recall@k of the dense index against an exhaustive search over the same vectors.
+
+    Passages scoring level with the exact k-th best (up to float rounding)
+    count as hits, whichever of them the tie-break picked.
+    """
+    hits = 0
+    for query_vec, (_, row_ids) in zip(query_vecs, engine.dense_candidates(query_vecs, k)):
+        similarity = to_similarity(exact_scores(engine.embeddings, query_vec, engine.metric), engine.metric)
+        cut = np.partition(similarity, -k)[-k] - 1e-6
+        hits += int(np.sum(similarity[np.searchsorted(engine.row_ids, row_ids[:k])] >= cut))
+    return hits / float(k * len(query_vecs))
+
+@contextlib.contextmanager
+def stub_serpapi(delay: float):
+    """Run a local SerpAPI stand-in answering after ``delay`` seconds."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSerpAPI)
+    server.daemon_threads = True
+    server.delay, server.calls, server.lock = delay, 0, threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def bench_engine(kb: pd.DataFrame, queries: List[str], targets: List[int], index_type: str,
+                 embedding_model, k: int = 10, threshold: float = 0.0,
+                 single_queries: int = 200) -> Dict[str, Any]:
+    """Build one index over ``kb`` and measure it. Returns one result row."""
+    engine = SearchEngine(embedding_model, index_type=index_type)
+    engine.result_cache = None  # measure search, not the cache
+
+    gc.collect()  # release the previous engine before taking the baseline
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    engine.index_kb_batches(prepare_kb(kb, settings.KB_BATCH_ROWS))
+    build_s = time.perf_counter() - start
+    rss_after = _rss_bytes()
+    # Memory this engine keeps resident: index, vectors, texts and lookup tables
+    rss_mb = round((rss_after - rss_before) / 2 ** 20, 1) if rss_before is not None else None
+
+    latencies = []
+    for query in queries[:single_queries]:
+        start = time.perf_counter()
+        engine.search(query, k, threshold)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    results = engine.search_batch(queries, k, threshold)
+    batch_s = time.perf_counter() - start
+
+    note_of_text = dict(zip(engine.kb_texts, engine.note_ids.tolist()))
+    hits = [target in {note_of_text[text] for text, _ in found} for found, target in zip(results, targets)]
+
+    return {
+        "rows": len(kb),
+        "passages": len(engine.kb_texts),
+        "index_type": index_type,
+        "params": engine.search_params,
+        "build_s": round(build_s, 3),
+        "embeddings_mb": round(engine.embeddings.nbytes / 2 ** 20, 1),
+        "rss_mb": rss_mb,
+        **_percentiles(latencies),
+        "batch_qps": round(len(queries) / batch_s, 1),
+        "recall@k": round(_dense_recall(engine, engine.encode_queries(queries), k), 4),
+        "hit@k": round(float(np.mean(hits)), 4),
+    }
+
+def bench_fallback(engine: SearchEngine, queries: List[str], delay: float,
+                   threshold: float) -> Dict[str, Any]:
+    """Time internal misses that fall through to (stubbed) external search.
+
+    Queries are distinct, so every miss pays the upstream round trip; the
+    response cache lives in a throwaway directory.
+    """
+    with stub_serpapi(delay) as server, tempfile.TemporaryDirectory() as cache_dir:
+        url = f"http://127.0.0.1:{server.server_address[1]}/search"
+        cache = ResponseCache(os.path.join(cache_dir, "serpapi.sqlite"), ttl=60)
+        searcher = ExternalSearcher(api_key="benchmark", base_url=url, cache=cache)
+        orchestrator = SearchOrchestrator(engine, searcher)
+        sources, latencies = {}, []
+        try:
+            for query in queries:
+                start = time.perf_counter()
+                response = orchestrator.search(query, 3, threshold)
+                latencies.append((time.perf_counter() - start) * 1000)
+                sources[response.source] = sources.get(response.source, 0) + 1
+        finally:
+            orchestrator.shutdown()
+            cache.close()
+        return {
+            "policy": orchestrator.policy,
+            "queries": len(queries),
+            "stub_delay_ms": round(delay * 1000, 1),
+            "external_calls": server.calls,
+            "sources": sources,
+            **_percentiles(latencies),
+        }
+
+def run_benchmark(sizes: Sequence[int], index_types: Sequence[str], n_queries: int = 1000,
+                  k: int = 10, threshold: float = 0.0, embedding_model=None, seed: int = 0,
+                  fallback_queries: int = 50, fallback_delay: float = 0.05) -> Dict[str, Any]:
+    """Run the suite and return a JSON-serializable report."""
+    embedding_model = embedding_model or HashingEmbedder()
+    results, last_engine = [], None
+    for size in sizes:
+        kb = make_kb(size, seed=seed)
+        queries, targets = make_queries(kb, n_queries, seed=seed + 1)
+        for index_type in index_types:
+            results.append(bench_engine(kb, queries, targets, index_type, embedding_model, k, threshold))
+        if fallback_queries and last_engine is None:
+            last_engine = SearchEngine(embedding_model, index_type="flat")
+            last_engine.index_kb_batches(prepare_kb(kb, settings.KB_BATCH_ROWS))
+
+    fallback = None
+    if last_engine is not None:
+        fallback = bench_fallback(last_engine, make_miss_queries(fallback_queries, seed=seed + 2),
+                                  fallback_delay, settings.SIMILARITY_THRESHOLD)
+    return {"meta": _meta(embedding_model, k, threshold, seed), "results": results, "fallback": fallback}
+
+def _meta(embedding_model, k: int, threshold: float, seed: int) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "faiss": faiss.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "model": embedding_model.cache_id,
+        "k": k,
+        "threshold": threshold,
+        "seed": seed,
+        "settings": {name: getattr(settings, name) for name in (
+            "SIMILARITY_METRIC", "HYBRID_SEARCH", "CHUNK_TOKENS", "CHUNK_OVERLAP",
+            "ANN_TARGET_RECALL", "IVF_NLIST", "PQ_M", "HNSW_M", "SEARCH_POLICY")},
+    }
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """List tracked metrics that got worse than ``baseline``.
+
+    Timing metrics may degrade by the relative ``tolerance``; quality
+    metrics by their absolute tolerance in ``TRACKED``.
+    """
+    previous = {(row["rows"], row["index_type"]): row for row in baseline.get("results", [])}
+    regressions = []
+    for row in current["results"]:
+        old = previous.get((row["rows"], row["index_type"]))
+        if old is None:
+            continue
+        for metric, (higher_is_better, absolute) in TRACKED.items():
+            if metric not in row or metric not in old:
+                continue
+            new_value, old_value = row[metric], old[metric]
+            if absolute is not None:
+                worse = old_value - new_value > absolute if higher_is_better else new_value - old_value > absolute
+            elif higher_is_better:
+                worse = new_value < old_value * (1 - tolerance)
+            else:
+                worse = new_value > old_value * (1 + tolerance)
+            if worse:
+                regressions.append({"rows": row["rows"], "index_type": row["index_type"],
+                                    "metric": metric, "baseline": old_value, "current": new_value})
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark search latency, throughput and recall on synthetic KBs.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated KB sizes (rows), up to 1000000")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma-separated index types")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries per KB size")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.0, help="Minimum confidence during the benchmark")
+    parser.add_argument("--model", help="Embedding model to benchmark end to end (default: hashing embedder)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fallback-queries", type=int, default=50, help="0 skips the external fallback benchmark")
+    parser.add_argument("--fallback-delay-ms", type=float, default=50.0, help="Latency of the SerpAPI stub")
+    parser.add_argument("-o", "--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier JSON report; exit 1 if tracked metrics regress")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    embedding_model = None
+    if args.model:
+        from src.models.embedding_model import EmbeddingModel
+        embedding_model = EmbeddingModel(args.model)
+
+    report = run_benchmark(
+        [int(s) for s in args.sizes.split(",") if s.strip()],
+        [t.strip() for t in args.types.split(",") if t.strip()],
+        n_queries=args.queries, k=args.k, threshold=args.threshold, embedding_model=embedding_model,
+        seed=args.seed, fallback_queries=args.fallback_queries, fallback_delay=args.fallback_delay_ms / 1000
+    )
+    print(format_report([{**row, "params": json.dumps(row["params"])} for row in report["results"]]))
+    if report["fallback"]:
+        print(f"\nfallback: {json.dumps(report['fallback'])}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_results(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {json.dumps(regression)}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Synthetic SAP-style knowledge bases and queries for benchmarking.
+
+Everything is seeded, so the same size and seed always produce the same KB,
+queries and embeddings, and results can be compared between releases.
+"""
+
+import functools
+import re
+import zlib
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Tuple
+from src.utils.data_loader import NoteIdAssigner, prepare_batch
+
+COMPONENTS = ["BC-DB-HDB", "BC-DB-ORA", "BC-CST", "BC-ABA-LA", "BC-MID-RFC", "BC-CTS-TMS",
+              "BC-OP-LNX", "BC-SEC-SSO", "BC-UPG-TLS", "BW-WHM-DST", "SD-BIL", "FI-GL-GL"]
+TRANSACTIONS = ["ST22", "SM21", "SM50", "SM66", "ST05", "STMS", "SM37", "SU53", "DBACOCKPIT",
+                "SE38", "SM59", "AL11", "RZ10", "SPAM", "ST03N", "SM12", "SM13", "SP01"]
+ERRORS = ["TSV_TNEW_PAGE_ALLOC_FAILED", "DBSQL_DUPLICATE_KEY_ERROR", "SAPSQL_ARRAY_INSERT_DUPREC",
+          "MESSAGE_TYPE_X", "TIME_OUT", "RFC_NO_AUTHORITY", "CALL_FUNCTION_REMOTE_ERROR",
+          "DBIF_RSQL_SQL_ERROR", "SYSTEM_NO_ROLL", "LOAD_PROGRAM_NOT_FOUND", "CONVT_NO_NUMBER",
+          "SYSTEM_CORE_DUMPED", "DBSQL_SQL_ERROR", "RAISE_EXCEPTION"]
+TOPICS = {
+    "memory": "memory extended heap roll paging quota allocation limit ztta em_initial_size_mb abap/heap_area_total",
+    "database": "database hana index table lock deadlock savepoint log volume backup recovery statement",
+    "transport": "transport import buffer tp r3trans request queue domain controller stms cofile datafile",
+    "rfc": "rfc destination gateway connection logon trusted timeout register program qrfc trfc",
+    "update": "update task v1 v2 posting terminated mail inbox sm13 record lock enqueue",
+    "kernel": "kernel patch disp+work dispatcher work process restart trace dev_w0 sapcar upgrade",
+    "security": "authorization role profile user certificate sso snc password lock audit",
+    "batch": "background job schedule variant spool output printer step cancelled periodic",
+}
+VERBS = ["occurs", "fails", "terminates", "hangs", "aborts", "is slow", "returns an error", "loops"]
+CONTEXTS = ["after upgrade", "during import", "in production", "after kernel patch", "at month end",
+            "when posting", "during system copy", "after restart"]
+FILLER = ("the system shows the error when the user starts the report and the work process is "
+          "terminated check the trace file and apply the correction instructions of this note").split()
+
+_TOKEN = re.compile(r"[a-z0-9_/+.\-]+")
+
+def make_kb(n_rows: int, seed: int = 0, description_words: int = 60) -> pd.DataFrame:
+    """Generate ``n_rows`` notes with SAP-like titles, descriptions and note numbers."""
+    rng = np.random.default_rng(seed)
+    topics = list(TOPICS)
+    topic_words = {topic: words.split() for topic, words in TOPICS.items()}
+    topic_of = rng.integers(len(topics), size=n_rows)
+    error_of = rng.integers(len(ERRORS), size=n_rows)
+    tx_of = rng.integers(len(TRANSACTIONS), size=n_rows)
+    comp_of = rng.integers(len(COMPONENTS), size=n_rows)
+    numbers = 1000000 + rng.choice(8999999, size=n_rows, replace=False)
+
+    titles, descriptions = [], []
+    for row in range(n_rows):
+        topic = topics[topic_of[row]]
+        error, tx = ERRORS[error_of[row]], TRANSACTIONS[tx_of[row]]
+        verb, context = VERBS[row % len(VERBS)], CONTEXTS[(row // len(VERBS)) % len(CONTEXTS)]
+        # A few rare words per note make it findable among thousands of similar ones
+        rare = f"{topic}{row % 997} z{row}"
+        titles.append(f"{error} in {tx} {verb} {context} ({COMPONENTS[comp_of[row]]})")
+        words = rng.choice(topic_words[topic] + FILLER, size=description_words)
+        descriptions.append(
+            f"Symptom: {error} {verb} in transaction {tx} {context}. {' '.join(words)} "
+            f"kernel 7.{53 + row % 40} patch {row % 1200} {rare}."
+        )
+    return pd.DataFrame({"Note Number": numbers, "Note Title": titles, "Description": descriptions})
+
+def prepare_kb(kb: pd.DataFrame, batch_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield an in-memory KB in batches prepared as ``data_loader.iter_kb`` prepares a KB file."""
+    assign = NoteIdAssigner()
+    for start in range(0, len(kb), batch_rows):
+        batch = prepare_batch(kb.iloc[start:start + batch_rows], assign)
+        if not batch.empty:
+            yield batch
+
+def make_queries(kb: pd.DataFrame, n_queries: int, seed: int = 1,
+                 words: int = 8) -> Tuple[List[str], List[int]]:
+    """Paraphrase-like queries drawn from random notes, with the source note number as target."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(kb), size=min(n_queries, len(kb)), replace=False)
+    queries, targets = [], []
+    for row in rows:
+        tokens = f"{kb['Note Title'].iat[row]} {kb['Description'].iat[row]}".split()
+        picked = rng.choice(tokens, size=min(words, len(tokens)), replace=False)
+        queries.append(" ".join(picked))
+        targets.append(int(kb['Note Number'].iat[row]))
+    return queries, targets
+
+def make_miss_queries(n_queries: int, seed: int = 2) -> List[str]:
+    """Queries sharing no vocabulary with the KB; they exercise the external fallback."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("bcdfghjklmnpqrstvwxz"))
+    return [" ".join("".join(rng.choice(letters, size=7)) for _ in range(4)) for _ in range(n_queries)]
+
+class HashingEmbedder:
+    """Deterministic feature-hashing embedder with the ``EmbeddingModel`` interface.
+
+    Lets index and search costs be measured at KB sizes where running a
+    transformer would dominate the benchmark; pass a real model to measure
+    end-to-end latency instead.
+    """
+
+    def __init__(self, dim: int = 128):
+        self.dim = dim
+        self.model_name = f"hashing-{dim}"
+        self.cache_id = self.model_name
+        self.batcher = None
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def worker_factory(self):
+        return functools.partial(HashingEmbedder, self.dim)
+
+    def _bucket(self, token: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            bucket = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+            if len(self._buckets) < 100000:  # note-specific tokens would grow this without bound
+                self._buckets[token] = bucket
+        return bucket
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        return [m.span() for m in re.finditer(r"\S+", text)]
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for token in _TOKEN.findall(text.lower()):
+                col, sign = self._bucket(token)
+                out[row, col] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+    def encode_single(self, text: str) -> np.ndarray:
+        return self.encode([text])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Offline bulk search over the knowledge base.
+
+Streams queries from a CSV or JSONL file and writes one JSON line of results
+per query, e.g.:
+
+    python bulk_search.py tickets.csv --query-field summary --id-field ticket_id -o results.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+def read_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """Yield query records from a CSV or JSONL file ('-' reads stdin)."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def batched(records: Iterator[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run KB search for every query in a CSV/JSONL file.")
+    parser.add_argument("input", help="CSV or JSONL file with queries ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from extension)")
+    parser.add_argument("--query-field", default="query", help="Field holding the query text")
+    parser.add_argument("--id-field", help="Field copied to the output to identify each query")
+    parser.add_argument("--k", type=int, help="Results per query (default: TOP_K_RESULTS)")
+    parser.add_argument("--threshold", type=float, help="Minimum confidence, 0-1 (default: SIMILARITY_THRESHOLD)")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Queries per encode/search batch")
+    args = parser.parse_args(argv)
+
+    from src.config.settings import settings
+    from src.models.embedding_model import EmbeddingModel
+    from src.models.index_builder import load_or_build_index
+    from src.models.index_store import IndexStore
+    from src.models.search_engine import SearchEngine
+
+    k = args.k or settings.TOP_K_RESULTS
+    threshold = args.threshold if args.threshold is not None else settings.SIMILARITY_THRESHOLD
+
+    search_engine = SearchEngine(EmbeddingModel(settings.EMBEDDING_MODEL))
+    load_or_build_index(search_engine, settings.KB_DATA_PATH, IndexStore(settings.INDEX_CACHE_DIR),
+                        search_engine.embedding_model.cache_id)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    count = 0
+    try:
+        for batch in batched(read_records(args.input, args.format), args.batch_size):
+            queries = [str(record.get(args.query_field) or "") for record in batch]
+            for record, query, results in zip(batch, queries, search_engine.search_batch(queries, k=k, threshold=threshold)):
+                row = {"query": query, "results": [{"text": text, "confidence": float(confidence)} for text, confidence in results]}
+                if args.id_field:
+                    row = {args.id_field: record.get(args.id_field), **row}
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += len(batch)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Processed {count} queries", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
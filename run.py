@@ -4,6 +4,7 @@ Entry point for the SAP Smart Chatbot application.
 Run this file to start the Streamlit app.
 """
 
+import argparse
 import sys
 import os
 import subprocess
@@ -14,8 +15,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 def run_streamlit():
     """Run the Streamlit app using subprocess."""
     try:
-        # Try to run streamlit directly
-        subprocess.run([sys.executable, "-m", "streamlit", "run", __file__], check=True)
+        # Try to run streamlit directly; --ui tells the script it is running inside Streamlit
+        subprocess.run([sys.executable, "-m", "streamlit", "run", __file__, "--", "--ui"], check=True)
     except subprocess.CalledProcessError:
         print("Error: Streamlit not found. Please install it first:")
         print("pip install streamlit")
@@ -25,10 +26,13 @@ def run_streamlit():
         sys.exit(1)
 
 if __name__ == "__main__":
-    # If run directly, start streamlit
-    if len(sys.argv) == 1:
-        run_streamlit()
-    else:
+    # Parse arguments before importing anything heavy, so --help answers at once
+    parser = argparse.ArgumentParser(description="Start the SAP support assistant web UI (Streamlit).")
+    parser.add_argument("--ui", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.ui:
         # This is when called by streamlit
         from src.main import main
-        main()
\ No newline at end of file
+        main()
+    else:
+        run_streamlit()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Entry point for the headless search service.
+Run this file to start the HTTP API (see src/server.py).
+"""
+
+import argparse
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+def main():
+    from src.config.settings import settings
+
+    parser = argparse.ArgumentParser(description="Serve /search, /search/batch and /healthz over HTTP.")
+    parser.add_argument("--host", default=settings.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVICE_WORKERS)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: uvicorn not found. Please install it first:")
+        print("pip install fastapi uvicorn")
+        sys.exit(1)
+
+    uvicorn.run("src.server:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
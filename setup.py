@@ -17,7 +17,12 @@ setup(
         "python-dotenv>=0.19.0",
         "openpyxl>=3.0.0",
     ],
-    python_requires=">=3.8",
+    extras_require={
+        "server": ["fastapi>=0.100.0", "pydantic>=2.0", "uvicorn>=0.23.0"],
+        "onnx": ["sentence-transformers[onnx]>=3.2.0"],
+        "parquet": ["pyarrow>=10.0.0"],
+    },
+    python_requires=">=3.9",
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
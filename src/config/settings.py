@@ -9,12 +9,89 @@ class Settings:
     
     # File paths
     KB_DATA_PATH = os.getenv("KB_DATA_PATH", "kb_data/sap_kb.xlsx")
+    INDEX_CACHE_DIR = os.getenv("INDEX_CACHE_DIR", ".cache/index")
+    INDEX_CACHE_KEEP = int(os.getenv("INDEX_CACHE_KEEP", "3"))  # newest index builds kept on disk, 0 keeps all
+    KB_CACHE_DIR = os.getenv("KB_CACHE_DIR", ".cache/kb")  # Parquet copies of Excel exports
+    KB_COLUMNAR_CACHE = os.getenv("KB_COLUMNAR_CACHE", "true").lower() == "true"
+    KB_BATCH_ROWS = int(os.getenv("KB_BATCH_ROWS", "5000"))
+    EMBED_CHECKPOINT_DIR = os.getenv("EMBED_CHECKPOINT_DIR", ".cache/embed")  # finished shards of interrupted builds
+    EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))  # processes encoding the KB, each with its own model
+    EMBED_SHARD_ROWS = int(os.getenv("EMBED_SHARD_ROWS", "2048"))  # passages per checkpointed shard
+    EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # threads per worker, 0 = cores / workers
+    KB_POLL_INTERVAL = float(os.getenv("KB_POLL_INTERVAL", "30"))  # seconds between KB change checks, 0 disables hot reload
     
     # Model settings
-    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")  # optional backend suffix, e.g. "all-MiniLM-L6-v2@onnx-int8"
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, onnx, onnx-int8
+    ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", ".cache/onnx")
+    ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")  # arm64, avx2, avx512, avx512_vnni
+    SIMILARITY_METRIC = os.getenv("SIMILARITY_METRIC", "cosine")  # cosine (inner product), l2
+    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.65"))  # minimum confidence, 0-1
+    CALIBRATION_PATH = os.getenv("CALIBRATION_PATH", ".cache/calibration.json")
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
     
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))  # 0 disables micro-batching
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+    
+    # Chunking settings (long descriptions are split into overlapping passages)
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))  # 0 embeds each note whole
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "40"))
+    CHUNK_OVERFETCH = int(os.getenv("CHUNK_OVERFETCH", "4"))  # passages fetched per requested note
+    
+    # Hybrid lexical + vector retrieval
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+    BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    
+    # Cross-encoder re-ranking of the top candidates
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "")  # e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"; empty disables
+    RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))  # notes re-scored per query
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))  # per query; unscored notes keep retrieval order
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+    
+    # Index settings
+    INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")  # flat, ivf_flat, ivf_pq, hnsw, sq8, fp16
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = derive from KB size
+    PQ_M = int(os.getenv("PQ_M", "0"))  # 0 = derive from embedding dimension
+    HNSW_M = int(os.getenv("HNSW_M", "32"))
+    ANN_TARGET_RECALL = float(os.getenv("ANN_TARGET_RECALL", "0.95"))
+    ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "2"))  # retrain once updates change the size or IVF list imbalance by this factor, 0 = never
+    RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))  # sq8/fp16/ivf_pq: candidates per result rescored exactly, 1 disables
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "false").lower() == "true"  # serve the cached index read-only from shared memory
+    
+    # Query cache settings
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # 0 disables caching
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "0"))  # seconds, 0 = no expiry
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))  # answers to recent queries, 0 disables
+    SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # seconds, 0 = no expiry
+    SEMANTIC_CACHE_SIMILARITY = float(os.getenv("SEMANTIC_CACHE_SIMILARITY", "0.95"))  # cosine radius for a hit
+    
+    # External search settings
+    SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search")
+    SERPAPI_CONNECT_TIMEOUT = float(os.getenv("SERPAPI_CONNECT_TIMEOUT", "3"))
+    SERPAPI_READ_TIMEOUT = float(os.getenv("SERPAPI_READ_TIMEOUT", "10"))
+    SERPAPI_RETRIES = int(os.getenv("SERPAPI_RETRIES", "2"))
+    SERPAPI_BACKOFF = float(os.getenv("SERPAPI_BACKOFF", "0.5"))
+    SERPAPI_CACHE_PATH = os.getenv("SERPAPI_CACHE_PATH", ".cache/serpapi.sqlite")
+    SERPAPI_CACHE_TTL = float(os.getenv("SERPAPI_CACHE_TTL", "86400"))  # seconds, 0 disables caching
+    
+    # Search orchestration settings
+    SEARCH_POLICY = os.getenv("SEARCH_POLICY", "sequential")  # sequential, speculative, always_both
+    SEARCH_LATENCY_BUDGET = float(os.getenv("SEARCH_LATENCY_BUDGET", "8"))  # seconds for the whole query
+    EXTERNAL_SEARCH_WORKERS = int(os.getenv("EXTERNAL_SEARCH_WORKERS", "4"))  # concurrent SerpAPI calls per process
+    
+    # Query service settings
+    SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
+    SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+    SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "1"))
+    FAST_START = os.getenv("FAST_START", "false").lower() == "true"  # accept requests (503) while the model and index load
+    SEARCH_SERVICE_URL = os.getenv("SEARCH_SERVICE_URL", "")  # UI calls this service instead of loading the model
+    
+    # Observability
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Streamlit: serve /metrics on this port, 0 disables
+    OTEL_TRACING = os.getenv("OTEL_TRACING", "false").lower() == "true"  # needs opentelemetry-api
+    
     # UI settings
     APP_TITLE = "SAP Intelligent Support Assistant (SLM + RAG)"
     APP_DESCRIPTION = "Built with RAG-powered SAP SLM. For internal and external issue resolution."
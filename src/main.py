@@ -1,48 +1,107 @@
+import time
 import streamlit as st
-import numpy as np
 from .config.settings import settings
-from .utils.data_loader import load_kb
-from .models.embedding_model import EmbeddingModel
-from .models.search_engine import SearchEngine
-from .utils.external_search import ExternalSearcher
+from .utils.metrics import cache_hit_rates, fallback_rate, stage_summary, start_metrics_server
+from .utils.warmup import start_warmup
+
+def render_system_info(orchestrator):
+    """Sidebar panel with KB size, fallback/cache rates and per-stage latency."""
+    with st.sidebar:
+        st.markdown("### System Info")
+        search_engine = getattr(orchestrator, "search_engine", None)
+        if search_engine is not None:
+            st.info(f"Knowledge Base: {len(search_engine.kb_texts)} passages")
+        index_manager = getattr(orchestrator, "index_manager", None)
+        if index_manager is not None and index_manager.version is not None:
+            version = index_manager.version
+            loaded = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(version.loaded_at))
+            st.caption(f"Index {version.key[:12]}, live since {loaded}, built in {version.build_seconds:.1f}s")
+            if index_manager.rebuilding:
+                st.caption("Rebuilding index from a new KB export...")
+            if index_manager.last_error:
+                st.warning(f"Last index reload failed: {index_manager.last_error}")
+        else:
+            st.info(f"Search service: {settings.SEARCH_SERVICE_URL}")
+        rate = fallback_rate()
+        if rate is not None:
+            st.info(f"External fallback rate: {rate:.0%}")
+        for cache, hit_rate in sorted(cache_hit_rates().items()):
+            st.caption(f"{cache} cache hit rate: {hit_rate:.0%}")
+        stages = stage_summary()
+        if stages:
+            st.markdown("**Stage latency (ms)**")
+            st.table(stages)
+
+def load_components():
+    """Build the search backend; heavy dependencies (torch, FAISS, pandas) are imported here."""
+    # Share a warm backend with other clients when a query service is configured
+    if settings.SEARCH_SERVICE_URL:
+        from .utils.search_client import SearchServiceClient
+        return SearchServiceClient(settings.SEARCH_SERVICE_URL)
+    
+    from .models.embedding_model import EmbeddingModel
+    from .models.index_manager import IndexManager
+    from .models.search_orchestrator import SearchOrchestrator
+    from .utils.external_search import ExternalSearcher
+    
+    # Reuse the cached index, re-encoding only notes changed since the last build;
+    # later KB exports are rebuilt in the background and swapped in
+    index_manager = IndexManager(EmbeddingModel(settings.EMBEDDING_MODEL))
+    index_manager.load()
+    index_manager.start()
+    
+    external_searcher = ExternalSearcher()
+    return SearchOrchestrator(index_manager, external_searcher)
+
+@st.cache_resource
+def warm_up():
+    """Start loading the components once per process, in the background, while the page renders."""
+    if settings.METRICS_PORT:
+        start_metrics_server(settings.METRICS_PORT)
+    return start_warmup(load_components)
 
 def main():
     st.title(settings.APP_TITLE)
-    
-    # Initialize components
-    @st.cache_resource
-    def load_components():
-        kb = load_kb(settings.KB_DATA_PATH)
-        embedding_model = EmbeddingModel(settings.EMBEDDING_MODEL)
-        search_engine = SearchEngine(embedding_model)
-        search_engine.build_index(kb['combined_text'].tolist())
-        external_searcher = ExternalSearcher()
-        return kb, search_engine, external_searcher
+    components = warm_up()
+    if components.done() and components.exception() is not None:
+        warm_up.clear()  # report the failure below and retry on the next rerun
     
     try:
-        kb, search_engine, external_searcher = load_components()
-        
         query = st.text_input("Enter your SAP infrastructure issue/question:")
+        if not query and not components.done():
+            st.caption("Loading the model and knowledge base in the background...")
         
         if query:
             with st.spinner("Thinking..."):
-                results = search_engine.search(
+                orchestrator = components.result()
+                response = orchestrator.search(
                     query, 
                     k=settings.TOP_K_RESULTS, 
                     threshold=settings.SIMILARITY_THRESHOLD
                 )
             
-            if results:
+            if response.internal:
                 st.subheader("Internal Knowledge Base Results")
-                for text, score in results:
-                    confidence = round(1 - score, 2)
+                for text, confidence in response.internal:
+                    confidence = round(confidence, 2)
                     st.markdown(f"**Confidence:** {confidence}\n\n{text[:300]}...")
             else:
                 st.warning("No confident match found in internal KB. Redirecting to external sources...")
+            
+            if response.external:
                 st.subheader("External Suggested Links")
-                external_results = external_searcher.search(query)
-                for link in external_results:
+                for link in response.external:
                     st.write(link)
+            elif response.error:
+                st.error(response.error)
+            
+            if response.timed_out:
+                st.info("Some sources did not answer within the latency budget; results may be partial.")
+            elif response.cached:
+                st.caption("Answer reused from a recent, near-identical question.")
+        
+        if components.done():
+            render_system_info(components.result())
         
         st.markdown("---")
         st.caption(settings.APP_DESCRIPTION)
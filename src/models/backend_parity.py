@@ -0,0 +1,95 @@
+"""
+Parity check between the PyTorch embedding path and an ONNX backend.
+
+Usage: python -m src.models.backend_parity --backend onnx-int8 [--queries queries.txt]
+
+Exits non-zero when embeddings or top-k results drift past the tolerances.
+"""
+
+import argparse
+import json
+import sys
+import time
+import faiss
+import numpy as np
+from typing import Dict, List, Optional
+from .onnx_backend import EMBEDDING_BACKENDS, load_sentence_transformer, parse_model_spec
+from ..config.settings import settings
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype="float32")
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+def _encode_timed(model, texts: List[str], batch_size: int):
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size)
+    return np.asarray(vectors, dtype="float32"), time.perf_counter() - start
+
+def compare_backends(model_name: str, backend: str, kb_texts: List[str], queries: List[str],
+                     k: int = 10, batch_size: int = 64) -> Dict[str, float]:
+    """Compare ``backend`` against PyTorch on the same KB texts and queries."""
+    reference = load_sentence_transformer(model_name, "torch")
+    candidate = load_sentence_transformer(model_name, backend)
+
+    ref_kb, ref_kb_s = _encode_timed(reference, kb_texts, batch_size)
+    cand_kb, cand_kb_s = _encode_timed(candidate, kb_texts, batch_size)
+    ref_q, _ = _encode_timed(reference, queries, batch_size)
+    cand_q, _ = _encode_timed(candidate, queries, batch_size)
+
+    cosine = np.sum(_normalize(ref_kb) * _normalize(cand_kb), axis=1)
+
+    # Each backend searches its own KB embeddings, as it would in production
+    k = min(k, len(kb_texts))
+    overlaps = []
+    ref_index = faiss.IndexFlatL2(ref_kb.shape[1])
+    ref_index.add(ref_kb)
+    cand_index = faiss.IndexFlatL2(cand_kb.shape[1])
+    cand_index.add(cand_kb)
+    _, ref_top = ref_index.search(ref_q, k)
+    _, cand_top = cand_index.search(cand_q, k)
+    for expected, found in zip(ref_top, cand_top):
+        overlaps.append(len(set(expected) & set(found)) / float(k))
+
+    return {
+        "backend": backend,
+        "kb_texts": len(kb_texts),
+        "queries": len(queries),
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"top{k}_overlap_mean": float(np.mean(overlaps)),
+        "top1_agreement": float(np.mean(ref_top[:, 0] == cand_top[:, 0])),
+        "torch_texts_per_s": len(kb_texts) / ref_kb_s,
+        f"{backend}_texts_per_s": len(kb_texts) / cand_kb_s,
+        "speedup": ref_kb_s / cand_kb_s,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from ..utils.data_loader import load_kb
+
+    parser = argparse.ArgumentParser(description="Check an ONNX embedding backend against PyTorch.")
+    parser.add_argument("--backend", default="onnx-int8", choices=[b for b in EMBEDDING_BACKENDS if b != "torch"])
+    parser.add_argument("--kb", default=settings.KB_DATA_PATH)
+    parser.add_argument("--queries", help="Text file with one query per line (default: KB note titles)")
+    parser.add_argument("--sample", type=int, default=2000, help="KB rows to encode")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    args = parser.parse_args(argv)
+
+    kb = load_kb(args.kb)
+    kb = kb.sample(n=min(args.sample, len(kb)), random_state=0)
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = kb['Note Title'].astype(str).tolist()[:500]
+
+    model_name, _ = parse_model_spec(settings.EMBEDDING_MODEL)
+    report = compare_backends(model_name, args.backend, kb['combined_text'].tolist(), queries, k=args.k)
+    print(json.dumps(report, indent=2))
+
+    ok = report["cosine_mean"] >= args.min_cosine and report[f"top{min(args.k, len(kb))}_overlap_mean"] >= args.min_overlap
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
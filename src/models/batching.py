@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+import numpy as np
+
+_STOP = object()
+
+class MicroBatcher:
+    """Coalesces concurrent single-text encode calls into batched forward passes.
+
+    A background thread takes the first waiting request, then collects more
+    for up to ``max_wait_ms`` or until ``max_batch_size`` items, encodes them
+    in one call and resolves each caller's future with its own row.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, window: int = 2048):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._batches = 0
+        self._items = 0
+        self._queue_wait_ms: deque = deque(maxlen=window)
+        self._latency_ms: deque = deque(maxlen=window)
+        self._batch_sizes: deque = deque(maxlen=window)
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode one text through the shared batch; returns a 1-D vector."""
+        return self.submit(text).result()
+
+    def _collect(self) -> List[tuple]:
+        first = self._queue.get()
+        if first is _STOP:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # Identical texts in one window share a row
+            started = time.monotonic()
+            unique = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = np.asarray(self.encode_fn(unique))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            rows = {text: vectors[i] for i, text in enumerate(unique)}
+            for text, future, _ in batch:
+                future.set_result(rows[text])
+
+            finished = time.monotonic()
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes.append(len(batch))
+                for _, _, enqueued in batch:
+                    self._queue_wait_ms.append((started - enqueued) * 1000)
+                    self._latency_ms.append((finished - enqueued) * 1000)
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, float]:
+        """Throughput and latency over the recent window of requests."""
+        with self._lock:
+            latency = np.asarray(self._latency_ms) if self._latency_ms else np.zeros(1)
+            queue_wait = np.asarray(self._queue_wait_ms) if self._queue_wait_ms else np.zeros(1)
+            elapsed = time.monotonic() - self._started
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+                "items_per_second": self._items / elapsed if elapsed > 0 else 0.0,
+                "queue_wait_p50_ms": float(np.percentile(queue_wait, 50)),
+                "queue_wait_p95_ms": float(np.percentile(queue_wait, 95)),
+                "latency_p50_ms": float(np.percentile(latency, 50)),
+                "latency_p95_ms": float(np.percentile(latency, 95)),
+                "latency_p99_ms": float(np.percentile(latency, 99)),
+            }
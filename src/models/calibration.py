@@ -0,0 +1,215 @@
+"""
+Score-to-confidence calibration for search results.
+
+Raw similarity scores are not comparable across embedding models or index
+metrics, so thresholds are expressed as a confidence in [0, 1]. Without a
+fitted calibration the confidence is the cosine similarity clipped to [0, 1];
+with one it is P(relevant | score) from Platt scaling on a labeled query set.
+
+Usage: python -m src.models.calibration labels.jsonl [--depth 10]
+
+The labels file (CSV or JSONL) has a ``query`` field and either ``note_id``
+(SAP note number) or ``note_title``; several relevant notes can be given as
+a list or separated by ``;``.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from ..config.settings import settings
+
+SIMILARITY_METRICS = ("cosine", "l2")
+
+def calibration_key(model_id: str, metric: str, text_rule: str) -> str:
+    """Scores depend on the model, metric and passage layout; calibrations are stored per combination."""
+    return f"{model_id}|{metric}|{text_rule}"
+
+def to_similarity(values: np.ndarray, metric: str) -> np.ndarray:
+    """Convert FAISS output to a cosine-like similarity (higher is better).
+
+    Inner products over normalized vectors already are cosines; squared L2
+    distances map through ``1 - d / 2``, which is the cosine for unit vectors.
+    """
+    values = np.asarray(values, dtype="float32")
+    return values if metric == "cosine" else 1.0 - values / 2.0
+
+class ScoreCalibrator:
+    """Monotone map from similarity to confidence, ``sigmoid(slope * s + intercept)``.
+
+    An unfitted calibrator clips the similarity to [0, 1].
+    """
+
+    def __init__(self, slope: Optional[float] = None, intercept: Optional[float] = None):
+        self.slope = slope
+        self.intercept = intercept
+
+    @property
+    def fitted(self) -> bool:
+        return self.slope is not None
+
+    def confidence(self, scores: np.ndarray) -> np.ndarray:
+        scores = np.asarray(scores, dtype="float64")
+        if not self.fitted:
+            return np.clip(scores, 0.0, 1.0)
+        return 1.0 / (1.0 + np.exp(-(self.slope * scores + self.intercept)))
+
+    def min_score(self, confidence: float) -> float:
+        """Lowest similarity whose confidence reaches ``confidence`` (-inf for <= 0)."""
+        if confidence <= 0.0:
+            return -math.inf
+        if not self.fitted:
+            return min(confidence, 1.0)
+        if confidence >= 1.0:
+            return math.inf
+        return (math.log(confidence / (1.0 - confidence)) - self.intercept) / self.slope
+
+    @classmethod
+    def fit(cls, scores: Sequence[float], labels: Sequence[bool], iterations: int = 50,
+            l2: float = 1e-3) -> "ScoreCalibrator":
+        """Fit Platt scaling by Newton's method on the logistic loss."""
+        x = np.asarray(scores, dtype="float64")
+        y = np.asarray(labels, dtype="float64")
+        if len(x) == 0 or y.min() == y.max():
+            raise ValueError("Calibration needs both relevant and non-relevant scores")
+        X = np.column_stack([x, np.ones_like(x)])
+        w = np.zeros(2)
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-X @ w))
+            gradient = X.T @ (p - y) + l2 * w
+            hessian = (X * (p * (1.0 - p))[:, None]).T @ X + l2 * np.eye(2)
+            step = np.linalg.solve(hessian, gradient)
+            w -= step
+            if np.abs(step).max() < 1e-8:
+                break
+        if w[0] <= 0:
+            raise ValueError("Scores do not separate relevant from non-relevant results")
+        return cls(float(w[0]), float(w[1]))
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"slope": self.slope, "intercept": self.intercept}
+
+    def save(self, path: str, key: str, **info) -> None:
+        """Store under ``key`` in a JSON file holding calibrations for several setups."""
+        entries = _read_entries(path)
+        entries[key] = {**self.to_dict(), **info}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".calibration-", dir=os.path.dirname(path) or ".")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, key: str) -> "ScoreCalibrator":
+        """Load the calibration for ``key``, or an unfitted calibrator if there is none."""
+        entry = _read_entries(path).get(key)
+        if entry is None:
+            return cls()
+        return cls(entry["slope"], entry["intercept"])
+
+def _read_entries(path: str) -> Dict[str, Dict[str, float]]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def expected_calibration_error(confidence: np.ndarray, labels: np.ndarray, bins: int = 10) -> float:
+    """Weighted gap between mean confidence and observed precision per confidence bin."""
+    confidence = np.asarray(confidence, dtype="float64")
+    labels = np.asarray(labels, dtype="float64")
+    which = np.minimum((confidence * bins).astype(int), bins - 1)
+    error = 0.0
+    for b in range(bins):
+        mask = which == b
+        if mask.any():
+            error += mask.mean() * abs(confidence[mask].mean() - labels[mask].mean())
+    return float(error)
+
+def labeled_scores(search_engine, queries: List[str], relevant: List[Set[int]],
+                   depth: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Best similarity per retrieved note for each query, labeled by relevance."""
+    query_vecs = search_engine.encode_queries(queries)
+    scores, labels = [], []
+    for (similarity, row_ids), notes in zip(search_engine.dense_candidates(query_vecs, depth), relevant):
+        seen = set()
+        for score, row_id in zip(similarity.tolist(), row_ids.tolist()):
+            note_id = int(search_engine.note_ids[search_engine._positions(row_id)])
+            if note_id in seen:
+                continue
+            seen.add(note_id)
+            scores.append(score)
+            labels.append(note_id in notes)
+            if len(seen) == depth:
+                break
+    return np.asarray(scores), np.asarray(labels)
+
+def _read_labels(path: str) -> Iterable[Dict[str, object]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            import csv
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def _as_list(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    return [v.strip() for v in str(value).split(";") if v.strip()]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .embedding_model import EmbeddingModel
+    from .index_builder import load_or_build_index
+    from .index_store import IndexStore
+    from .search_engine import SearchEngine
+    from ..utils.data_loader import load_kb
+
+    parser = argparse.ArgumentParser(description="Fit the score-to-confidence calibration from labeled queries.")
+    parser.add_argument("labels", help="CSV/JSONL with query and note_id or note_title fields")
+    parser.add_argument("--kb", default=settings.KB_DATA_PATH)
+    parser.add_argument("--depth", type=int, default=10, help="Retrieved notes scored per query")
+    parser.add_argument("--output", default=settings.CALIBRATION_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Report without saving")
+    args = parser.parse_args(argv)
+
+    engine = SearchEngine(EmbeddingModel(settings.EMBEDDING_MODEL))
+    load_or_build_index(engine, args.kb, IndexStore(settings.INDEX_CACHE_DIR), engine.embedding_model.cache_id)
+    kb = load_kb(args.kb)
+    by_title = dict(zip(kb['Note Title'].astype(str), kb['note_id'].tolist()))
+
+    queries, relevant = [], []
+    for record in _read_labels(args.labels):
+        notes = {int(float(n)) for n in _as_list(record.get("note_id"))}
+        notes |= {by_title[t] for t in _as_list(record.get("note_title")) if t in by_title}
+        if record.get("query") and notes:
+            queries.append(str(record["query"]))
+            relevant.append(notes)
+    if not queries:
+        print("No usable labeled queries", file=sys.stderr)
+        return 1
+
+    scores, labels = labeled_scores(engine, queries, relevant, args.depth)
+    calibrator = ScoreCalibrator.fit(scores, labels)
+    report = {
+        "queries": len(queries),
+        "pairs": int(len(scores)),
+        "relevant": int(labels.sum()),
+        **calibrator.to_dict(),
+        "ece_uncalibrated": round(expected_calibration_error(ScoreCalibrator().confidence(scores), labels), 4),
+        "ece_calibrated": round(expected_calibration_error(calibrator.confidence(scores), labels), 4),
+        "similarity_at_confidence": {str(c): round(calibrator.min_score(c), 4) for c in (0.5, 0.65, 0.8, 0.9)},
+    }
+    print(json.dumps(report, indent=2))
+    if not args.dry_run:
+        calibrator.save(args.output, engine.calibration_key, queries=len(queries), pairs=int(len(scores)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,68 @@
-from sentence_transformers import SentenceTransformer
+import functools
 import numpy as np
-from typing import List
+from typing import Callable, List, Optional, Tuple
+from .batching import MicroBatcher
+from .onnx_backend import load_sentence_transformer, parse_model_spec
+from .query_cache import QueryCache
+from ..config.settings import settings
+from ..utils.text_spans import word_spans
+from ..utils.metrics import record_cache, timed
 
 class EmbeddingModel:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
-        self.model_name = model_name
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", query_cache: Optional[QueryCache] = None,
+                 backend: Optional[str] = None):
+        self.model_name, self.backend = parse_model_spec(model_name, backend or settings.EMBEDDING_BACKEND)
+        self.model = load_sentence_transformer(self.model_name, self.backend)
+        if query_cache is None and settings.QUERY_CACHE_SIZE > 0:
+            query_cache = QueryCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL)
+        self.query_cache = query_cache
+        self.batcher: Optional[MicroBatcher] = None
+        if settings.EMBEDDING_BATCH_MAX_WAIT_MS > 0:
+            self.batcher = MicroBatcher(
+                self.model.encode,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+            )
     
-    def encode(self, texts: List[str]) -> np.ndarray:
+    @property
+    def cache_id(self) -> str:
+        """Identifies the embedding space; backends differ numerically, so each gets its own index cache."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+    
+    def worker_factory(self) -> Callable[[], object]:
+        """Picklable loader of the same model, for encoding in worker processes."""
+        return functools.partial(load_sentence_transformer, self.model_name, self.backend)
+    
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """Character spans of the model's tokens, for token-aware chunking."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+            return word_spans(text)
+        return tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """Encode texts to embeddings."""
-        return self.model.encode(texts)
+        with timed("embed"):
+            return self.model.encode(texts, batch_size=batch_size)
+    
+    def _encode_one(self, text: str) -> np.ndarray:
+        # Concurrent callers share one forward pass via the micro-batcher
+        if self.batcher is not None:
+            return self.batcher.encode(text).reshape(1, -1)
+        return self.model.encode([text])
     
     def encode_single(self, text: str) -> np.ndarray:
-        """Encode single text to embedding."""
-        return self.model.encode([text])
\ No newline at end of file
+        """Encode single text to embedding, reusing cached query embeddings."""
+        if self.query_cache is None:
+            with timed("embed_query"):
+                return self._encode_one(text)
+        
+        cached = self.query_cache.get(text)
+        record_cache("query_embedding", cached is not None)
+        if cached is not None:
+            return cached
+        with timed("embed_query"):
+            embedding = self._encode_one(text)
+        embedding.setflags(write=False)
+        self.query_cache.put(text, embedding)
+        return embedding
\ No newline at end of file
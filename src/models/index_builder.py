@@ -0,0 +1,112 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sys
+from typing import Callable, List, Optional
+from .index_store import IndexStore, compute_cache_key, file_digest
+from .search_engine import SearchEngine
+from ..config.settings import settings
+from ..utils.data_loader import EXCEL_EXTENSIONS, convert_kb, diff_kb_batches, iter_kb
+
+def columnar_kb_path(kb_path: str, cache_dir: Optional[str] = None) -> str:
+    """Return a Parquet copy of an Excel KB, converting it on first use.
+    
+    Copies are named by the source path and the export's content hash, so a
+    new export is converted once and later reloads skip openpyxl entirely;
+    copies of earlier exports of the same file are removed then. Non-Excel
+    sources, and environments without pyarrow, use ``kb_path`` as is.
+    """
+    if not kb_path.lower().endswith(EXCEL_EXTENSIONS):
+        return kb_path
+    cache_dir = cache_dir or settings.KB_CACHE_DIR
+    # KBs at other paths may share the cache directory; only this file's old copies are pruned
+    source = hashlib.sha256(os.path.abspath(kb_path).encode("utf-8")).hexdigest()[:16]
+    target = os.path.join(cache_dir, f"{source}-{file_digest(kb_path)[:32]}.parquet")
+    if os.path.exists(target):
+        return target
+    try:
+        convert_kb(kb_path, target, settings.KB_BATCH_ROWS)
+    except ImportError:
+        return kb_path
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(f"{source}-") and name.endswith(".parquet") and path != target:
+            with contextlib.suppress(OSError):  # still open on Windows, or removed by another worker
+                os.remove(path)
+    return target
+
+def index_cache_key(search_engine: SearchEngine, kb_path: str, model_name: str) -> str:
+    """Cache key of the index ``search_engine`` would build for the KB file."""
+    ann_params = [f"{name}={value}" for name, value in sorted(search_engine.ann_params.items())]
+    return compute_cache_key(kb_path, model_name, search_engine.passage_rule, search_engine.index_type,
+                             search_engine.metric, *ann_params)
+
+def load_or_build_index(search_engine: SearchEngine, kb_path: str, store: IndexStore,
+                        model_name: str, incremental: bool = True,
+                        progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """Bring ``search_engine`` up to date with the KB file and return the cache key.
+    
+    An unchanged KB loads straight from the cache. A changed KB starts from the
+    latest cached build for the same model, text rule, index type, metric and
+    ANN parameters and only re-encodes added/changed notes; otherwise the index
+    is built from scratch.
+    The KB is streamed in batches in both cases. Concurrent callers build a
+    given key once; the others wait and load the result. ``progress`` is
+    called with (finished, total) embedding shards during a full build.
+    """
+    text_rule = search_engine.passage_rule
+    cache_key = index_cache_key(search_engine, kb_path, model_name)
+    if search_engine.load(store, cache_key):
+        return cache_key
+    
+    with store.build_lock(cache_key):
+        # Another worker may have built it while we waited for the lock
+        if search_engine.load(store, cache_key):
+            return cache_key
+        source = columnar_kb_path(kb_path) if settings.KB_COLUMNAR_CACHE else kb_path
+        batches = iter_kb(source, settings.KB_BATCH_ROWS)
+        meta = {"model": model_name, "text_rule": text_rule, "index_type": search_engine.index_type,
+                "metric": search_engine.metric, **search_engine.ann_params}
+        previous_key: Optional[str] = store.latest(**meta) if incremental else None
+        if previous_key is not None and search_engine.load(store, previous_key):
+            search_engine.apply_diff(diff_kb_batches(search_engine.snapshot(), batches))
+        else:
+            search_engine.index_kb_batches(batches, progress=progress)
+        search_engine.save(store, cache_key, meta=meta)
+    if search_engine.mmap or search_engine.compact:
+        # Serve the saved copy like every other worker rather than a private one; compact
+        # indexes keep only their codes in memory and read full vectors from the mapped file
+        search_engine.load(store, cache_key)
+    return cache_key
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Build (or refresh) the cached index ahead of starting workers."""
+    from .embedding_model import EmbeddingModel
+    
+    parser = argparse.ArgumentParser(description="Build the cached search index for a KB export.")
+    parser.add_argument("--kb", default=settings.KB_DATA_PATH)
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of diffing the latest build")
+    args = parser.parse_args(argv)
+    
+    embedding_model = EmbeddingModel(settings.EMBEDDING_MODEL)
+    search_engine = SearchEngine(embedding_model)
+    store = IndexStore(settings.INDEX_CACHE_DIR)
+    reported = []
+    
+    def progress(done: int, total: int) -> None:
+        # Shards are submitted while the KB is read, so the total grows until the last batch
+        reported.append(done)
+        print(f"\rEmbedded shards: {done}/{total}", end="", file=sys.stderr, flush=True)
+    
+    cache_key = load_or_build_index(search_engine, args.kb, store, embedding_model.cache_id,
+                                    incremental=not args.full, progress=progress)
+    if reported:
+        print(file=sys.stderr)
+    print(json.dumps({"key": cache_key, "path": store.path_for(cache_key),
+                      "documents": len(search_engine.kb_texts)}))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
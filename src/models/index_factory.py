@@ -0,0 +1,185 @@
+import math
+import warnings
+import faiss
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "fp16")
+# Lossy codes: search them for a wider candidate set, then rescore exactly from float32 vectors
+COMPACT_INDEX_TYPES = ("sq8", "fp16", "ivf_pq")
+# Trained (quantizers, value ranges) or tuned (efSearch) on the vectors present at build time
+TRAINED_INDEX_TYPES = ("ivf_flat", "ivf_pq", "hnsw", "sq8")
+METRICS = ("l2", "cosine")  # cosine = inner product over L2-normalized vectors
+
+# k-means wants ~39 training points per centroid; PQ trains 256 centroids per sub-quantizer.
+MIN_POINTS_PER_CENTROID = 39
+PQ_CENTROIDS = 256
+RECALL_PLATEAU = 0.005
+
+def _default_nlist(n_vectors: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // MIN_POINTS_PER_CENTROID))
+
+def _default_pq_m(dim: int) -> int:
+    # Aim for ~8 dimensions per sub-quantizer, using a divisor of dim
+    m = max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+def _faiss_metric(metric: str) -> int:
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Expected one of {METRICS}")
+    return faiss.METRIC_INNER_PRODUCT if metric == "cosine" else faiss.METRIC_L2
+
+def _flat_index(dim: int, metric: str) -> faiss.Index:
+    return faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+
+def index_metric(index: faiss.Index) -> str:
+    """The metric name a built index scores with."""
+    return "cosine" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+def create_index(dim: int, n_vectors: int, index_type: str = "flat", nlist: int = 0,
+                 pq_m: int = 0, hnsw_m: int = 32, metric: str = "l2") -> faiss.Index:
+    """Create an (untrained) base index of the requested type and metric.
+
+    Falls back to a flat index when the KB is too small to train the
+    requested quantizer.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}")
+    faiss_metric = _faiss_metric(metric)
+
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m, faiss_metric)
+
+    if index_type in ("sq8", "fp16"):
+        # 1 or 2 bytes per dimension instead of 4; sq8 learns per-dimension ranges when trained
+        qtype = faiss.ScalarQuantizer.QT_8bit if index_type == "sq8" else faiss.ScalarQuantizer.QT_fp16
+        return faiss.IndexScalarQuantizer(dim, qtype, faiss_metric)
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or _default_nlist(n_vectors)
+        min_points = MIN_POINTS_PER_CENTROID * max(nlist, PQ_CENTROIDS if index_type == "ivf_pq" else 1)
+        if n_vectors < min_points:
+            warnings.warn(f"{n_vectors} vectors are too few to train '{index_type}' "
+                          f"(need {min_points}); using a flat index")
+            return _flat_index(dim, metric)
+        quantizer = _flat_index(dim, metric)
+        if index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss_metric)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or _default_pq_m(dim), 8, faiss_metric)
+
+    return _flat_index(dim, metric)
+
+def build_ann_index(embeddings: np.ndarray, ids: np.ndarray, index_type: str = "flat",
+                    nlist: int = 0, pq_m: int = 0, hnsw_m: int = 32, metric: str = "l2") -> faiss.IndexIDMap2:
+    """Create, train and fill an ID-mapped index over the embeddings.
+
+    For ``metric="cosine"`` the embeddings must already be L2-normalized.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    n_vectors, dim = embeddings.shape
+    base = create_index(dim, n_vectors, index_type, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m, metric=metric)
+    if not base.is_trained:
+        base.train(embeddings)
+    index = faiss.IndexIDMap2(base)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype="int64"))
+    return index
+
+def exact_scores(vectors: np.ndarray, query: np.ndarray, metric: str = "l2") -> np.ndarray:
+    """Full-precision FAISS scores of stored vectors against one query.
+
+    Inner products for ``"cosine"``, squared L2 distances otherwise, i.e. the
+    values a flat index would return.
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if metric == "cosine":
+        return vectors @ query
+    return np.sum((vectors - query) ** 2, axis=1)
+
+def rescore(vectors: np.ndarray, query: np.ndarray, candidates: np.ndarray, k: int,
+            metric: str = "l2") -> Tuple[np.ndarray, np.ndarray]:
+    """Exact scores and positions of the best ``k`` candidate rows of ``vectors``, best first.
+
+    ``vectors`` may be a read-only memory map: only the candidate rows are read.
+    """
+    scores = exact_scores(vectors[candidates], query, metric)
+    order = np.argsort(-scores if metric == "cosine" else scores, kind="stable")[:k]
+    return scores[order], candidates[order]
+
+def _search_param(index: faiss.Index) -> Optional[Tuple[str, List[int]]]:
+    """Return the recall/speed knob of an index and its candidate values."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexIVF):
+        candidates = [1 << i for i in range(int(math.log2(base.nlist)) + 1)]
+        if candidates[-1] != base.nlist:
+            candidates.append(base.nlist)
+        return "nprobe", candidates
+    if isinstance(base, faiss.IndexHNSW):
+        return "efSearch", [16, 32, 64, 128, 256, 512, 1024]
+    return None
+
+def list_imbalance(index: faiss.Index) -> float:
+    """Imbalance factor of an IVF index's inverted lists (1.0 = even); 1.0 for other types."""
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if not isinstance(base, faiss.IndexIVF) or base.ntotal == 0:
+        return 1.0
+    return float(base.invlists.imbalance_factor())
+
+def set_search_params(index: faiss.Index, params: Dict[str, int]) -> None:
+    """Apply search-time parameters such as nprobe or efSearch."""
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        space.set_index_parameter(index, name, value)
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    """Mean fraction of the exact top-k neighbours that were retrieved."""
+    k = expected.shape[1]
+    hits = sum(len(set(f[:k]) & set(e)) for f, e in zip(found, expected))
+    return hits / float(expected.size)
+
+def sample_queries(embeddings: np.ndarray, n_queries: int = 200, seed: int = 0) -> np.ndarray:
+    """Draw perturbed KB vectors to stand in for real queries."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), size=min(n_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(rows)], dtype="float32")
+    scale = 0.1 * float(np.linalg.norm(queries, axis=1).mean()) / math.sqrt(queries.shape[1])
+    return np.ascontiguousarray(queries + rng.normal(scale=scale, size=queries.shape).astype("float32"))
+
+def exact_neighbours(embeddings: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int,
+                     metric: str = "l2") -> np.ndarray:
+    """Ground-truth top-k note IDs from an exhaustive search."""
+    flat = _flat_index(embeddings.shape[1], metric)
+    flat.add(np.ascontiguousarray(embeddings, dtype="float32"))
+    _, positions = flat.search(queries, k)
+    return np.asarray(ids)[positions]
+
+def tune_search_params(index: faiss.Index, embeddings: np.ndarray, ids: np.ndarray,
+                       k: int = 10, target_recall: float = 0.95, n_queries: int = 200) -> Dict[str, int]:
+    """Pick the cheapest nprobe/efSearch that reaches ``target_recall`` at k.
+
+    Stops early once recall plateaus below the target. The chosen value is
+    applied to the index (and so persisted with it).
+    """
+    knob = _search_param(index)
+    if knob is None or len(embeddings) == 0:
+        return {}
+    name, candidates = knob
+    k = min(k, len(embeddings))
+    queries = sample_queries(embeddings, n_queries)
+    expected = exact_neighbours(embeddings, ids, queries, k, index_metric(index))
+
+    params, best_recall = {}, -1.0
+    for value in candidates:
+        trial = {name: max(value, k) if name == "efSearch" else value}
+        set_search_params(index, trial)
+        _, found = index.search(queries, k)
+        recall = recall_at_k(found, expected)
+        if params and recall - best_recall < RECALL_PLATEAU:
+            # Quantization error caps recall (e.g. PQ); probing more only costs latency
+            break
+        params, best_recall = trial, recall
+        if recall >= target_recall:
+            break
+    set_search_params(index, params)
+    return params
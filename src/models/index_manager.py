@@ -0,0 +1,165 @@
+"""
+Hot-swappable search index.
+
+``IndexManager`` owns the active ``SearchEngine``. A background poller watches
+the KB file; when an export changes (and has stopped changing), a new engine
+is built next to the live one and swapped in with a single reference
+assignment. Queries that already hold the previous engine finish on it.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from .embedding_model import EmbeddingModel
+from .index_builder import index_cache_key, load_or_build_index
+from .index_store import IndexStore
+from .search_engine import SearchEngine
+from ..config.settings import settings
+from ..utils.metrics import INDEX_RELOADS, timed
+
+class IndexVersion(NamedTuple):
+    key: str  # index cache key: KB content, model, passage rule, index type, metric
+    kb_path: str
+    documents: int
+    loaded_at: float  # epoch seconds when this version went live
+    build_seconds: float
+
+def _kb_signature(kb_path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(kb_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class IndexManager:
+    """Serve one ``SearchEngine`` at a time and rebuild it in the background when the KB changes.
+
+    Readers take ``manager.engine`` once per query and use that object
+    throughout; ``refresh`` never modifies an engine that has been handed out.
+    """
+
+    def __init__(self, embedding_model: EmbeddingModel, kb_path: Optional[str] = None,
+                 store: Optional[IndexStore] = None, poll_interval: Optional[float] = None,
+                 engine_factory: Optional[Callable[[EmbeddingModel], SearchEngine]] = None):
+        self.embedding_model = embedding_model
+        self.kb_path = kb_path or settings.KB_DATA_PATH
+        self.store = store or IndexStore(settings.INDEX_CACHE_DIR)
+        self.poll_interval = poll_interval if poll_interval is not None else settings.KB_POLL_INTERVAL
+        self.engine_factory = engine_factory or SearchEngine
+        self._active: Optional[Tuple[SearchEngine, IndexVersion]] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._pending: Optional[Tuple[int, int]] = None
+        self._failed: Optional[Tuple[int, int]] = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.rebuilding = False
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def engine(self) -> SearchEngine:
+        if self._active is None:
+            raise ValueError("Index not loaded. Call load() first.")
+        return self._active[0]
+
+    @property
+    def version(self) -> Optional[IndexVersion]:
+        return self._active[1] if self._active is not None else None
+
+    def load(self) -> IndexVersion:
+        """Load or build the index for the current KB file, warm it up and make it active."""
+        with self._build_lock:
+            self._swap(self._signature_now(), self._build())
+        return self.version
+
+    def _signature_now(self) -> Optional[Tuple[int, int]]:
+        return _kb_signature(self.kb_path)
+
+    def _build(self) -> Tuple[SearchEngine, IndexVersion]:
+        started = time.monotonic()
+        engine = self.engine_factory(self.embedding_model)
+        key = load_or_build_index(engine, self.kb_path, self.store, self.embedding_model.cache_id)
+        engine.warm_up()  # swapped-in versions answer their first query at full speed
+        version = IndexVersion(key, self.kb_path, len(engine.kb_texts), time.time(),
+                               round(time.monotonic() - started, 3))
+        return engine, version
+
+    def _swap(self, signature: Optional[Tuple[int, int]], active: Tuple[SearchEngine, IndexVersion]) -> None:
+        self._active = active  # one assignment: readers see the old or the new pair, never a mix
+        self._signature = signature
+        self._pending = None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild and swap if the KB file changed. Returns True if a new version went live.
+
+        A change is acted on once the file looks the same on two consecutive
+        checks, so an export still being written is not picked up half-way.
+        A failed build keeps the current version and is not retried until the
+        file changes again.
+        """
+        self.last_check = time.time()
+        signature = self._signature_now()
+        if not force:
+            if signature is None or signature == self._signature or signature == self._failed:
+                return False
+            if signature != self._pending:
+                self._pending = signature
+                return False
+        if not self._build_lock.acquire(blocking=False):
+            return False  # a rebuild is already running
+        try:
+            current = self.version
+            if (not force and current is not None
+                    and index_cache_key(self.engine, self.kb_path, self.embedding_model.cache_id) == current.key):
+                # Touched but not changed
+                self._signature, self._pending = signature, None
+                return False
+            self.rebuilding = True
+            with timed("index_reload"):
+                active = self._build()
+            self._swap(signature, active)
+        except Exception as e:
+            self._failed, self._pending = signature, None
+            self.last_error = f"{type(e).__name__}: {e}"
+            INDEX_RELOADS.inc(result="error")
+            return False
+        finally:
+            self.rebuilding = False
+            self._build_lock.release()
+        self._failed, self.last_error = None, None
+        self.reloads += 1
+        INDEX_RELOADS.inc(result="ok")
+        return True
+
+    def start(self) -> None:
+        """Poll the KB file from a daemon thread every ``poll_interval`` seconds (0 disables)."""
+        if self.poll_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._poll, daemon=True, name="index-reload")
+        self._thread.start()
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self.refresh()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        """Active version and reload state, for operators."""
+        version = self.version
+        return {
+            **(version._asdict() if version is not None else {}),
+            "reloads": self.reloads,
+            "rebuilding": self.rebuilding,
+            "poll_interval": self.poll_interval,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
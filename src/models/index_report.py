@@ -0,0 +1,113 @@
+"""
+Recall-vs-latency report for the configurable index types.
+
+Usage: python -m src.models.index_report [--queries queries.txt] [--k 10]
+"""
+
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from .index_factory import (COMPACT_INDEX_TYPES, INDEX_TYPES, build_ann_index, exact_neighbours, recall_at_k,
+                            rescore, sample_queries, tune_search_params)
+from ..config.settings import settings
+
+def recall_latency_report(embeddings: np.ndarray, queries: np.ndarray, k: int = 10,
+                          index_types: Sequence[str] = INDEX_TYPES,
+                          target_recall: float = 0.95, metric: str = "l2") -> List[Dict[str, float]]:
+    """Build each index type and measure recall@k and per-query latency against flat search.
+
+    Compact types are measured as served: ``settings.RESCORE_FACTOR * k``
+    candidates from the index, rescored exactly. ``raw_recall@k`` is the
+    index alone.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    ids = np.arange(len(embeddings), dtype="int64")
+    expected = exact_neighbours(embeddings, ids, queries, k, metric)
+
+    rows = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_ann_index(
+            embeddings, ids, index_type,
+            nlist=settings.IVF_NLIST, pq_m=settings.PQ_M, hnsw_m=settings.HNSW_M, metric=metric
+        )
+        params = tune_search_params(index, embeddings, ids, k=k, target_recall=target_recall)
+        build_seconds = time.perf_counter() - start
+
+        fetch_k = k * settings.RESCORE_FACTOR if index_type in COMPACT_INDEX_TYPES else k
+        latencies = []
+        found = np.full((len(queries), k), -1, dtype="int64")
+        for row, query in enumerate(queries):
+            start = time.perf_counter()
+            _, candidates = index.search(query.reshape(1, -1), fetch_k)
+            if fetch_k > k:
+                candidates = candidates[0][candidates[0] != -1]
+                best = rescore(embeddings, query, candidates, k, metric)[1]
+                found[row, :len(best)] = best
+            else:
+                found[row] = candidates[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+        _, raw = index.search(queries, k)
+
+        rows.append({
+            "index_type": index_type,
+            "params": params,
+            "build_s": round(build_seconds, 3),
+            "index_mb": round(faiss.serialize_index(index).nbytes / 2 ** 20, 2),
+            f"recall@{k}": round(recall_at_k(found, expected), 4),
+            f"raw_recall@{k}": round(recall_at_k(raw, expected), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        })
+    return rows
+
+def format_report(rows: List[Dict[str, float]]) -> str:
+    """Render report rows as a fixed-width table."""
+    if not rows:
+        return ""
+    columns = list(rows[0].keys())
+    cells = [[str(row[col]) for col in columns] for row in rows]
+    widths = [max(len(col), *(len(r[i]) for r in cells)) for i, col in enumerate(columns)]
+    lines = ["  ".join(col.ljust(w) for col, w in zip(columns, widths))]
+    lines += ["  ".join(cell.ljust(w) for cell, w in zip(r, widths)) for r in cells]
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .embedding_model import EmbeddingModel
+    from .index_builder import load_or_build_index
+    from .index_store import IndexStore
+    from .search_engine import SearchEngine
+
+    parser = argparse.ArgumentParser(description="Compare recall and latency of index types on the KB.")
+    parser.add_argument("--kb", default=settings.KB_DATA_PATH, help="KB spreadsheet to index")
+    parser.add_argument("--queries", help="Text file with one query per line (default: perturbed KB vectors)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma-separated index types")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    # Flat build (usually cached) provides the embeddings every mode is built from
+    embedding_model = EmbeddingModel(settings.EMBEDDING_MODEL)
+    engine = SearchEngine(embedding_model, index_type="flat")
+    load_or_build_index(engine, args.kb, IndexStore(settings.INDEX_CACHE_DIR), embedding_model.cache_id)
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = engine.encode_queries([line.strip() for line in f if line.strip()])
+    else:
+        queries = sample_queries(engine.embeddings)
+
+    rows = recall_latency_report(
+        engine.embeddings, queries, k=args.k,
+        index_types=[t.strip() for t in args.types.split(",") if t.strip()],
+        target_recall=settings.ANN_TARGET_RECALL, metric=engine.metric
+    )
+    print(json.dumps(rows, indent=2) if args.json else format_report(rows))
+
+if __name__ == "__main__":
+    main()
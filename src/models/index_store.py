@@ -0,0 +1,215 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import faiss
+import numpy as np
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from ..config.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builds are not serialized
+    fcntl = None
+
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 3  # entries written in another layout are treated as cache misses
+# Maps the vector codes of flat/HNSW/IVF indexes; older FAISS only maps IVF lists
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+class TextTable(Sequence[str]):
+    """Read-only list of strings over UTF-8 bytes and offsets arrays.
+
+    Stored as two ``.npy`` arrays (see ``pack_texts``) and loaded
+    memory-mapped, so processes serving the same entry share the texts
+    through the page cache; a text is decoded only when it is read.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+        return self._data[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+def pack_texts(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (UTF-8 bytes, offsets) arrays for ``TextTable``."""
+    encoded: List[bytes] = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype="uint8"), offsets
+
+class StoredIndex(NamedTuple):
+    index: faiss.Index
+    arrays: Dict[str, np.ndarray]  # memory-mapped, read-only
+    tables: Dict[str, Any]
+    manifest: Dict[str, Any]
+
+def file_digest(filepath: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_cache_key(kb_path: str, model_name: str, text_rule: str, *extra: str) -> str:
+    """Key an index build by KB content, embedding model, text rule and index options."""
+    digest = hashlib.sha256()
+    for part in (file_digest(kb_path), model_name, text_rule) + extra:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+class IndexStore:
+    """On-disk cache of built search indexes, one directory per cache key.
+
+    Each entry holds the FAISS index, named NumPy arrays (``.npy``) and named
+    JSON tables, plus a manifest with caller-supplied metadata. Every save
+    prunes the cache to the ``keep`` newest entries (0 keeps all).
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, keep: Optional[int] = None):
+        self.cache_dir = cache_dir or settings.INDEX_CACHE_DIR
+        self.keep = keep if keep is not None else settings.INDEX_CACHE_KEEP
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path_for(key), MANIFEST_FILE))
+
+    @contextlib.contextmanager
+    def build_lock(self, key: str) -> Iterator[None]:
+        """Hold an exclusive cross-process lock for building ``key``.
+
+        Workers starting together on a new KB wait here while one of them
+        builds, then load its result instead of building their own.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, f".{key}.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def save(self, key: str, index: faiss.Index, arrays: Dict[str, np.ndarray],
+             tables: Optional[Dict[str, Any]] = None, meta: Optional[Dict[str, Any]] = None) -> str:
+        """Write index artifacts for a key; the directory appears atomically."""
+        tables = tables or {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=self.cache_dir)
+        try:
+            faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            for name, table in tables.items():
+                with open(os.path.join(tmp_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+                    json.dump(table, f, ensure_ascii=False)
+            manifest = {
+                "key": key,
+                "format": FORMAT_VERSION,
+                "count": int(index.ntotal),
+                "arrays": sorted(arrays),
+                "tables": sorted(tables),
+                "created": time.time(),
+                "meta": meta or {},
+            }
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+            target = self.path_for(key)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.replace(tmp_dir, target)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.prune()
+        return target
+
+    def _manifests(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (key, manifest) for every complete entry, in any format."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            manifest_path = os.path.join(self.cache_dir, name, MANIFEST_FILE)
+            if name.startswith(".") or not os.path.exists(manifest_path):
+                continue
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    yield name, json.load(f)
+            except (OSError, ValueError):  # removed or rewritten by another worker meanwhile
+                continue
+
+    def latest(self, **meta: Any) -> Optional[str]:
+        """Return the most recently saved key whose manifest meta matches."""
+        best_key, best_created = None, -1.0
+        for name, manifest in self._manifests():
+            if manifest.get("format") != FORMAT_VERSION:
+                continue
+            stored_meta = manifest.get("meta", {})
+            if all(stored_meta.get(k) == v for k, v in meta.items()) and manifest["created"] > best_created:
+                best_key, best_created = name, manifest["created"]
+        return best_key
+
+    def prune(self, keep: Optional[int] = None) -> List[str]:
+        """Remove all but the ``keep`` newest entries and return the removed keys.
+
+        Entries in an older format are never loaded again and go first.
+        Workers still serving a removed entry keep their memory-mapped files
+        until they reload.
+        """
+        keep = self.keep if keep is None else keep
+        if keep <= 0:
+            return []
+        entries = sorted(self._manifests(), reverse=True,
+                         key=lambda item: (item[1].get("format") == FORMAT_VERSION, item[1].get("created", 0.0)))
+        removed = []
+        for name, _ in entries[keep:]:
+            # Lock files stay: another worker may hold one while it rebuilds that key
+            shutil.rmtree(self.path_for(name), ignore_errors=True)
+            removed.append(name)
+        return removed
+
+    def load(self, key: str, mmap: bool = False) -> Optional[StoredIndex]:
+        """Load artifacts for a key, or return None if not cached.
+
+        With ``mmap`` the FAISS index is memory-mapped read-only like the
+        arrays, so processes serving the same entry share one copy through the
+        page cache. A mapped index must not be modified; copy it first
+        (``faiss.deserialize_index(faiss.serialize_index(index))``).
+        """
+        if not self.exists(key):
+            return None
+        path = self.path_for(key)
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_VERSION:
+            return None
+        index = faiss.read_index(os.path.join(path, INDEX_FILE), MMAP_FLAGS if mmap else 0)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in manifest["arrays"]
+        }
+        tables = {}
+        for name in manifest["tables"]:
+            with open(os.path.join(path, f"{name}.json"), "r", encoding="utf-8") as f:
+                tables[name] = json.load(f)
+        return StoredIndex(index, arrays, tables, manifest)
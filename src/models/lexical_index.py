@@ -0,0 +1,161 @@
+import math
+import re
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .query_cache import normalize_query
+
+# Keeps SAP identifiers whole: st22, sapsql_array_insert_duprec, 7.53, /sapapo/om17
+_TOKEN = re.compile(r"[a-z0-9_/]+(?:[.\-][a-z0-9_/]+)*")
+_NOTE_LOOKUP = re.compile(r"^(?:sap note )?0*(\d{4,10})$")
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased SAP-aware tokens; numbers lose leading zeros (note numbers)."""
+    tokens = _TOKEN.findall(text.casefold())
+    return [t.lstrip("0") or "0" if t.isdigit() else t for t in tokens]
+
+def is_exact_token(token: str) -> bool:
+    """Identifier-like tokens that dense embeddings blur.
+
+    Note numbers (4+ digits), codes mixing letters and digits (st22,
+    /sapapo/om17) and error IDs (tsv_tnew_page_alloc_failed). Short numbers
+    and versions ("printer 1", "7.53") are ordinary words.
+    """
+    if token.isdigit():
+        return len(token) >= 4
+    has_letter = any(c.isalpha() for c in token)
+    return has_letter and (any(c.isdigit() for c in token) or "_" in token)
+
+def extract_note_number(query: str) -> Optional[int]:
+    """Return the note number if the query is just a note reference ('SAP Note 0002345678')."""
+    match = _NOTE_LOOKUP.match(normalize_query(query))
+    return int(match.group(1)) if match else None
+
+class BM25Index:
+    """Compact in-memory BM25 index over KB passages.
+
+    Documents are stored twice as flat NumPy arrays: a forward index
+    (per-document term IDs and frequencies) used for incremental updates and
+    a CSR inverted index used for scoring. Documents are identified by the
+    same row IDs as the FAISS index.
+    """
+
+    ARRAYS = ("row_ids", "doc_len", "fw_offsets", "fw_terms", "fw_tf", "inv_indptr", "inv_docs", "inv_tf")
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.row_ids = np.empty(0, dtype="int64")
+        self.doc_len = np.empty(0, dtype="float32")
+        self.fw_offsets = np.zeros(1, dtype="int64")
+        self.fw_terms = np.empty(0, dtype="int32")
+        self.fw_tf = np.empty(0, dtype="float32")
+        self.inv_indptr = np.zeros(1, dtype="int64")
+        self.inv_docs = np.empty(0, dtype="int32")
+        self.inv_tf = np.empty(0, dtype="float32")
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def _encode_docs(self, texts: Sequence[str]):
+        offsets, terms, tfs, lengths = [0], [], [], []
+        for text in texts:
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self.vocab)
+                terms.append(term_id)
+                tfs.append(tf)
+            offsets.append(offsets[-1] + len(counts))
+            lengths.append(sum(counts.values()))
+        return (np.asarray(offsets, dtype="int64"), np.asarray(terms, dtype="int32"),
+                np.asarray(tfs, dtype="float32"), np.asarray(lengths, dtype="float32"))
+
+    def build(self, row_ids: Sequence[int], texts: Sequence[str]) -> None:
+        self.vocab = {}
+        self.fw_offsets, self.fw_terms, self.fw_tf, self.doc_len = self._encode_docs(texts)
+        self.row_ids = np.asarray(row_ids, dtype="int64")
+        self._build_inverted()
+
+    def add(self, row_ids: Sequence[int], texts: Sequence[str]) -> None:
+        """Tokenize only the new documents and append them."""
+        offsets, terms, tfs, lengths = self._encode_docs(texts)
+        self.fw_offsets = np.concatenate([self.fw_offsets, offsets[1:] + self.fw_offsets[-1]])
+        self.fw_terms = np.concatenate([self.fw_terms, terms])
+        self.fw_tf = np.concatenate([self.fw_tf, tfs])
+        self.doc_len = np.concatenate([self.doc_len, lengths])
+        self.row_ids = np.concatenate([self.row_ids, np.asarray(row_ids, dtype="int64")])
+        self._build_inverted()
+
+    def delete(self, row_ids: Sequence[int]) -> None:
+        keep = ~np.isin(self.row_ids, np.asarray(row_ids, dtype="int64"))
+        if keep.all():
+            return
+        sizes = np.diff(self.fw_offsets)
+        entry_keep = np.repeat(keep, sizes)
+        self.fw_terms = self.fw_terms[entry_keep]
+        self.fw_tf = self.fw_tf[entry_keep]
+        self.fw_offsets = np.concatenate([[0], np.cumsum(sizes[keep])]).astype("int64")
+        self.doc_len = self.doc_len[keep]
+        self.row_ids = self.row_ids[keep]
+        self._build_inverted()
+
+    def _build_inverted(self) -> None:
+        doc_index = np.repeat(np.arange(len(self.row_ids), dtype="int32"), np.diff(self.fw_offsets))
+        order = np.argsort(self.fw_terms, kind="stable")
+        self.inv_docs = doc_index[order]
+        self.inv_tf = self.fw_tf[order]
+        counts = np.bincount(self.fw_terms, minlength=len(self.vocab))
+        self.inv_indptr = np.concatenate([[0], np.cumsum(counts)]).astype("int64")
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (row_ids, scores, exact_match) for the top-k documents.
+
+        ``exact_match`` marks documents containing an identifier-like query token.
+        Documents tied with the k-th are all returned, ties in row ID order,
+        so the result does not depend on the order documents were added.
+        """
+        empty = (np.empty(0, dtype="int64"), np.empty(0, dtype="float32"), np.empty(0, dtype=bool))
+        n_docs = len(self.row_ids)
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if n_docs == 0 or not terms:
+            return empty
+
+        scores = np.zeros(n_docs, dtype="float32")
+        exact = np.zeros(n_docs, dtype=bool)
+        avg_len = float(self.doc_len.mean(dtype="float64")) or 1.0  # exact: lengths are whole numbers
+        for term in terms:
+            term_id = self.vocab[term]
+            start, end = self.inv_indptr[term_id], self.inv_indptr[term_id + 1]
+            docs, tf = self.inv_docs[start:end], self.inv_tf[start:end]
+            idf = math.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / avg_len)
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+            if is_exact_token(term):
+                exact[docs] = True
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            kth = np.partition(scores[matched], len(matched) - k)[len(matched) - k]
+            matched = matched[scores[matched] >= kth]
+        matched = matched[np.lexsort((self.row_ids[matched], -scores[matched]))]
+        return self.row_ids[matched], scores[matched], exact[matched]
+
+    def to_artifacts(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """Arrays and tables for ``IndexStore.save``, prefixed with ``bm25_``."""
+        arrays = {f"bm25_{name}": getattr(self, name) for name in self.ARRAYS}
+        terms = sorted(self.vocab, key=self.vocab.get)
+        return arrays, {"bm25_vocab": terms, "bm25_params": {"k1": self.k1, "b": self.b}}
+
+    @classmethod
+    def from_artifacts(cls, arrays: Dict[str, np.ndarray], tables: Dict[str, Any]) -> Optional["BM25Index"]:
+        """Rebuild from stored artifacts, or return None if they are missing."""
+        if "bm25_vocab" not in tables or any(f"bm25_{name}" not in arrays for name in cls.ARRAYS):
+            return None
+        index = cls(**tables["bm25_params"])
+        index.vocab = {term: i for i, term in enumerate(tables["bm25_vocab"])}
+        for name in cls.ARRAYS:
+            setattr(index, name, np.asarray(arrays[f"bm25_{name}"]))
+        return index
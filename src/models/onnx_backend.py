@@ -0,0 +1,61 @@
+import glob
+import os
+from typing import TYPE_CHECKING, Tuple
+from ..config.settings import settings
+
+if TYPE_CHECKING:  # importing sentence-transformers loads torch; defer it to the first model load
+    from sentence_transformers import SentenceTransformer
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def parse_model_spec(spec: str, default_backend: str = "torch") -> Tuple[str, str]:
+    """Split 'all-MiniLM-L6-v2@onnx-int8' into model name and backend."""
+    name, _, backend = spec.partition("@")
+    backend = backend or default_backend
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}")
+    return name, backend
+
+def _export_dir(model_name: str) -> str:
+    return os.path.join(settings.ONNX_CACHE_DIR, model_name.replace("/", "__"))
+
+def _find_onnx_file(export_dir: str, pattern: str) -> str:
+    matches = sorted(glob.glob(os.path.join(export_dir, "**", pattern), recursive=True))
+    return os.path.relpath(matches[0], export_dir) if matches else ""
+
+def load_sentence_transformer(model_name: str, backend: str = "torch") -> "SentenceTransformer":
+    """Load a SentenceTransformer on the PyTorch, ONNX or int8-quantized ONNX runtime.
+
+    ONNX exports and their dynamic int8 quantization are produced once and
+    kept under ``settings.ONNX_CACHE_DIR``.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}")
+
+    try:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+    except ImportError:
+        raise ImportError("ONNX backends need sentence-transformers>=3.2 with ONNX Runtime: "
+                          "pip install 'sentence-transformers[onnx]'")
+
+    export_dir = _export_dir(model_name)
+    if not os.path.exists(os.path.join(export_dir, "modules.json")):
+        # Exports the PyTorch weights to ONNX when the hub has no ONNX file
+        SentenceTransformer(model_name, backend="onnx").save(export_dir)
+    if backend == "onnx":
+        return SentenceTransformer(export_dir, backend="onnx")
+
+    quantized_file = _find_onnx_file(export_dir, "*_qint8.onnx")
+    if not quantized_file:
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(export_dir, backend="onnx"),
+            settings.ONNX_QUANTIZATION_CONFIG,
+            export_dir,
+            file_suffix="qint8"
+        )
+        quantized_file = _find_onnx_file(export_dir, "*_qint8.onnx")
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": quantized_file})
@@ -0,0 +1,85 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# "SAP Note 0002345678", "note #2345678", "Note no. 2345678" -> "sap note 2345678"
+_NOTE_NUMBER = re.compile(r"\b(?:sap\s*)?notes?\s*(?:#|no\.?|nr\.?|number|:)?\s*0*(\d{3,10})\b")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a query: case-folded, single-spaced, note numbers unpadded."""
+    text = _WHITESPACE.sub(" ", text.casefold()).strip()
+    return _NOTE_NUMBER.sub(r"sap note \1", text)
+
+class QueryCache:
+    """Thread-safe LRU cache keyed by normalized query text, with optional TTL.
+
+    Each entry remembers the raw query that produced it, so hits are counted
+    separately as exact (same text) or normalized (same after normalization).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self._entries: "OrderedDict[Hashable, Tuple[str, Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, query: str, extra: Tuple[Hashable, ...]) -> Hashable:
+        return (normalize_query(query),) + extra
+
+    def get(self, query: str, *extra: Hashable) -> Optional[Any]:
+        """Return the cached value for a query (plus any extra key parts), or None."""
+        key = self._key(query, extra)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry[0] == query:
+                self.exact_hits += 1
+            else:
+                self.normalized_hits += 1
+            return entry[1]
+
+    def put(self, query: str, value: Any, *extra: Hashable) -> None:
+        if self.max_size <= 0:
+            return
+        key = self._key(query, extra)
+        with self._lock:
+            self._entries[key] = (query, value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for sizing the cache."""
+        with self._lock:
+            hits = self.exact_hits + self.normalized_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "exact_hits": self.exact_hits,
+                "normalized_hits": self.normalized_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
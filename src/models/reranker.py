@@ -0,0 +1,88 @@
+"""
+Cross-encoder re-ranking under a per-query time budget.
+
+The bi-encoder ranks the KB cheaply; a small cross-encoder then reads each
+(query, passage) pair of the top candidates and reorders them, which
+separates near-duplicate notes far better. Pairs are scored in batches
+until the budget runs out: scored candidates are reordered, the rest keep
+their retrieval order behind them, so a slow or overloaded host degrades
+to the plain retrieval ranking rather than to slow answers.
+"""
+
+import functools
+import threading
+import time
+import numpy as np
+from typing import TYPE_CHECKING, List, Optional
+from ..config.settings import settings
+from ..utils.metrics import RERANK_DEGRADED, timed
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+@functools.lru_cache(maxsize=None)
+def load_cross_encoder(model_name: str) -> "CrossEncoder":
+    """Load a cross-encoder once per process; rebuilt search engines share it."""
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name)
+
+class CrossEncoderReranker:
+    """Reorder the top ``top_n`` candidates by cross-encoder score within ``budget_ms``.
+
+    ``model`` is anything with ``predict(pairs) -> scores`` (a
+    ``CrossEncoder``); by default ``model_name`` is loaded on first use.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, top_n: Optional[int] = None,
+                 budget_ms: Optional[float] = None, batch_size: Optional[int] = None, model=None):
+        self.model_name = model_name or settings.RERANK_MODEL
+        self.top_n = top_n if top_n is not None else settings.RERANK_TOP_N
+        self.budget = (budget_ms if budget_ms is not None else settings.RERANK_BUDGET_MS) / 1000.0
+        self.batch_size = batch_size or settings.RERANK_BATCH_SIZE
+        self._model = model
+        self._lock = threading.Lock()
+        self._pair_seconds: Optional[float] = None  # running estimate of the cost of one pair
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load_cross_encoder(self.model_name)
+        return self._model
+
+    def _score(self, query: str, texts: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        scores = np.asarray(self.model.predict([(query, text) for text in texts]), dtype="float32")
+        pair_seconds = (time.perf_counter() - started) / len(texts)
+        with self._lock:
+            previous = self._pair_seconds
+            self._pair_seconds = pair_seconds if previous is None else 0.8 * previous + 0.2 * pair_seconds
+        return scores.reshape(-1)
+
+    @timed("rerank")
+    def rerank(self, query: str, texts: List[str]) -> List[int]:
+        """Return candidate indices in re-ranked order.
+
+        Only the first ``top_n`` candidates are scored, a batch at a time;
+        a batch is started only if the cost estimate says it fits in what is
+        left of the budget.
+        """
+        n = min(len(texts), self.top_n)
+        deadline = time.perf_counter() + self.budget
+        scores: List[float] = []
+        while len(scores) < n:
+            remaining = deadline - time.perf_counter()
+            pair_seconds = self._pair_seconds
+            affordable = self.batch_size if pair_seconds is None else int(remaining / max(pair_seconds, 1e-9))
+            size = min(self.batch_size, n - len(scores), affordable)
+            if size <= 0 or remaining <= 0:
+                break
+            scores.extend(self._score(query, texts[len(scores):len(scores) + size]).tolist())
+        if len(scores) < n:
+            RERANK_DEGRADED.inc()
+        # Stable sort: ties, and candidates left unscored, keep their retrieval order
+        scored = sorted(range(len(scores)), key=lambda i: -scores[i])
+        return scored + list(range(len(scores), len(texts)))
+
+    def warm_up(self) -> None:
+        """Load the model and measure the cost of a pair before the first query."""
+        self._score("warm up", ["warm up"] * min(self.batch_size, 4))
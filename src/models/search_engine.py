@@ -1,35 +1,560 @@
+import itertools
 import faiss
 import numpy as np
-from typing import List, Tuple, Optional
+import pandas as pd
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Set, Tuple, Optional
 from .embedding_model import EmbeddingModel
+from .calibration import ScoreCalibrator, calibration_key, to_similarity
+from .index_factory import (COMPACT_INDEX_TYPES, METRICS, TRAINED_INDEX_TYPES, build_ann_index, list_imbalance,
+                            rescore, set_search_params, tune_search_params)
+from .index_store import IndexStore, TextTable, pack_texts
+from .lexical_index import BM25Index, extract_note_number
+from .query_cache import QueryCache
+from .reranker import CrossEncoderReranker
+from .sharded_embedder import ShardedEmbedder
+from ..config.settings import settings
+from ..utils.data_loader import KBDiff, chunk_rule, content_hash, kb_passages
+from ..utils.metrics import record_cache, timed
+
+_generations = itertools.count(1)
+
+def _tied_ranks(scores: List[float]) -> List[int]:
+    """Ranks of scores sorted best first; equal scores share the rank of the first."""
+    ranks = []
+    for i, score in enumerate(scores):
+        ranks.append(ranks[-1] if i and score == scores[i - 1] else i)
+    return ranks
 
 class SearchEngine:
-    def __init__(self, embedding_model: EmbeddingModel):
+    """FAISS search over KB passages.
+    
+    Long notes are split into several passages (rows); each row carries its
+    note ID and a unique FAISS row ID. Results are deduplicated per note,
+    keeping the best-scoring passage. With hybrid search enabled, a BM25
+    index over the same rows is fused with the dense ranking, and bare
+    note-number queries are answered without encoding the query. With a
+    re-ranker, a wider candidate list is reordered by a cross-encoder
+    before the top k are returned.
+    
+    Compact index types (sq8, fp16, ivf_pq) hold reduced-precision codes in
+    memory; their candidates are rescored exactly from the float32
+    embeddings, which stay on disk memory-mapped once loaded from the cache.
+    
+    Results carry a confidence in [0, 1] (see ``calibration``); ``threshold``
+    is the minimum confidence a result needs.
+    """
+    
+    def __init__(self, embedding_model: EmbeddingModel, index_type: Optional[str] = None,
+                 result_cache: Optional[QueryCache] = None):
         self.embedding_model = embedding_model
-        self.index: Optional[faiss.IndexFlatL2] = None
-        self.kb_texts: List[str] = []
+        self.index_type = index_type or settings.INDEX_TYPE
+        self.metric = settings.SIMILARITY_METRIC
+        if self.metric not in METRICS:
+            raise ValueError(f"Unknown similarity metric '{self.metric}'. Expected one of {METRICS}")
+        self.chunk_tokens = settings.CHUNK_TOKENS
+        self.chunk_overlap = settings.CHUNK_OVERLAP
+        self.search_params: Dict[str, int] = {}
+        self.trained_rows = 0  # index size and IVF list imbalance when last trained
+        self.trained_imbalance = 1.0
+        self.mmap = settings.INDEX_MMAP
+        self.index: Optional[faiss.IndexIDMap2] = None
+        self.index_mapped = False
+        self.kb_texts: Sequence[str] = []  # a memory-mapped TextTable once loaded from the cache
+        self.embeddings: Optional[np.ndarray] = None
+        self.note_ids: np.ndarray = np.empty(0, dtype="int64")
+        self.row_ids: np.ndarray = np.empty(0, dtype="int64")
+        self.note_hashes: Dict[int, str] = {}
+        self._notes: Set[int] = set()
+        self.generation = 0  # changes with every index change; unique across engines in this process
+        self.lexical: Optional[BM25Index] = BM25Index(settings.BM25_K1, settings.BM25_B) if settings.HYBRID_SEARCH else None
+        if result_cache is None and settings.QUERY_CACHE_SIZE > 0:
+            result_cache = QueryCache(settings.QUERY_CACHE_SIZE, settings.QUERY_CACHE_TTL)
+        self.result_cache = result_cache
+        self.reranker: Optional[CrossEncoderReranker] = CrossEncoderReranker() if settings.RERANK_MODEL else None
+        self.calibrator = ScoreCalibrator.load(settings.CALIBRATION_PATH, self.calibration_key)
+    
+    @property
+    def passage_rule(self) -> str:
+        """How KB rows become indexed passages; part of the cache key."""
+        return chunk_rule(self.chunk_tokens, self.chunk_overlap)
+    
+    @property
+    def ann_params(self) -> Dict[str, Any]:
+        """Structural and tuning parameters of ANN index builds; part of the cache key."""
+        return {"nlist": settings.IVF_NLIST, "pq_m": settings.PQ_M, "hnsw_m": settings.HNSW_M,
+                "target_recall": settings.ANN_TARGET_RECALL}
+    
+    @property
+    def compact(self) -> bool:
+        """Whether dense candidates are rescored from full-precision vectors."""
+        return self.index_type in COMPACT_INDEX_TYPES and settings.RESCORE_FACTOR > 1
+    
+    @property
+    def calibration_key(self) -> str:
+        return calibration_key(self.embedding_model.cache_id, self.metric, self.passage_rule)
+    
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """Copy to contiguous float32 rows, L2-normalized for the cosine metric."""
+        vectors = np.array(vectors, dtype="float32", order="C", ndmin=2)
+        if self.metric == "cosine" and len(vectors):
+            faiss.normalize_L2(vectors)
+        return vectors
+    
+    def encode_queries(self, queries: List[str], batch_size: int = 256) -> np.ndarray:
+        """Encode queries the way indexed passages were encoded."""
+        return self._prepare(self.embedding_model.encode(list(queries), batch_size=batch_size))
+    
+    def _passages(self, df: pd.DataFrame) -> Tuple[List[int], List[str]]:
+        return kb_passages(df, self.chunk_tokens, self.chunk_overlap, self.embedding_model.token_spans)
+    
+    def index_kb(self, df: pd.DataFrame) -> None:
+        """Chunk and index a loaded KB (see ``data_loader.load_kb``)."""
+        self.index_kb_batches([df])
     
-    def build_index(self, texts: List[str]) -> None:
-        """Build FAISS index from texts."""
-        self.kb_texts = texts
-        embeddings = self.embedding_model.encode(texts)
+    @timed("index_kb")
+    def index_kb_batches(self, batches: Iterable[pd.DataFrame],
+                         progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Chunk, encode and index a KB streamed in batches (see ``data_loader.iter_kb``).
         
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(np.array(embeddings))
+        Passages are encoded in checkpointed shards as batches arrive (see
+        ``ShardedEmbedder``), across ``settings.EMBED_WORKERS`` processes, so
+        only passage texts and embeddings are accumulated, never the full KB
+        frame, and an interrupted build resumes from its finished shards.
+        """
+        note_ids: List[int] = []
+        texts: List[str] = []
+        note_hashes: Dict[int, str] = {}
+        embedder = ShardedEmbedder(self.embedding_model, progress=progress)
+        try:
+            for batch in batches:
+                batch_ids, batch_texts = self._passages(batch)
+                embedder.add(batch_texts)
+                note_ids.extend(batch_ids)
+                texts.extend(batch_texts)
+                note_hashes.update(zip(batch['note_id'].tolist(), batch['content_hash'].tolist()))
+            vectors = embedder.finish()
+        finally:
+            embedder.close()
+        self.build_index(texts, vectors, ids=note_ids, note_hashes=note_hashes)
+        embedder.cleanup()
     
-    def search(self, query: str, k: int = 3, threshold: float = 0.7) -> List[Tuple[str, float]]:
-        """Search for top-k similar texts."""
+    @timed("build_index")
+    def build_index(self, texts: List[str], embeddings: Optional[np.ndarray] = None,
+                    ids: Optional[np.ndarray] = None, note_hashes: Optional[Dict[int, str]] = None) -> None:
+        """Build FAISS index from texts, reusing precomputed embeddings if given.
+        
+        ``ids`` are the stable note ID of each text (repeated for passages of
+        one note) used for incremental updates; they default to row
+        positions. ``note_hashes`` maps note IDs to the ``content_hash`` of
+        their combined text, as ``diff_kb`` compares it; notes missing from it
+        are hashed from their text, which is only right for unchunked notes.
+        ANN index types are trained here and their search parameters tuned
+        to ``settings.ANN_TARGET_RECALL``.
+        """
+        if embeddings is None:
+            embeddings = self.embedding_model.encode(texts)
+        if ids is None:
+            ids = np.arange(len(texts), dtype="int64")
+        self.kb_texts = list(texts)
+        self.embeddings = self._prepare(embeddings)
+        self.note_ids = np.asarray(ids, dtype="int64")
+        self.row_ids = np.arange(len(texts), dtype="int64")
+        self.note_hashes = {}
+        self._hash_notes(self.note_ids.tolist(), self.kb_texts, note_hashes)
+        if self.lexical is not None:
+            self.lexical.build(self.row_ids, self.kb_texts)
+        self._rebuild_index()
+    
+    def _rebuild_index(self) -> None:
+        self.index_mapped = False
+        params = self.ann_params
+        self.index = build_ann_index(
+            self.embeddings,
+            self.row_ids,
+            self.index_type,
+            nlist=params["nlist"],
+            pq_m=params["pq_m"],
+            hnsw_m=params["hnsw_m"],
+            metric=self.metric
+        )
+        self.search_params = tune_search_params(
+            self.index, self.embeddings, self.row_ids, target_recall=params["target_recall"]
+        )
+        self.trained_rows = len(self.row_ids)
+        self.trained_imbalance = list_imbalance(self.index)
+        self._reindex_positions()
+    
+    def _drifted(self) -> bool:
+        """Whether updates have moved the index too far from the vectors it was trained on."""
+        growth = settings.ANN_RETRAIN_GROWTH
+        rows = len(self.row_ids)
+        if self.index_type not in TRAINED_INDEX_TYPES or growth <= 0 or rows == 0:
+            return False
+        if rows > self.trained_rows * growth or rows * growth < self.trained_rows:
+            return True
+        # Vectors added far from the trained centroids pile up in a few IVF lists
+        return list_imbalance(self.index) > self.trained_imbalance * growth
+    
+    def _updated(self) -> None:
+        """Retrain and retune after an incremental update that drifted the index."""
+        if self._drifted():
+            self._rebuild_index()
+        else:
+            self._reindex_positions()
+    
+    def _reindex_positions(self) -> None:
+        self._notes = set(self.note_ids.tolist())
+        self.generation = next(_generations)
+        # Any index change makes cached results stale
+        if self.result_cache is not None:
+            self.result_cache.clear()
+    
+    def _hash_notes(self, ids: List[int], texts: List[str], note_hashes: Optional[Dict[int, str]]) -> None:
+        if note_hashes is not None:
+            self.note_hashes.update((note_id, note_hashes[note_id]) for note_id in ids if note_id in note_hashes)
+        for note_id, text in zip(ids, texts):
+            self.note_hashes.setdefault(note_id, content_hash(text))
+    
+    def _positions(self, row_ids: np.ndarray) -> np.ndarray:
+        """Array positions of index row IDs; ``row_ids`` is kept in ascending order."""
+        return np.searchsorted(self.row_ids, row_ids)
+    
+    def _require_index(self) -> None:
         if self.index is None:
             raise ValueError("Index not built. Call build_index() first.")
+    
+    def _own_index(self) -> None:
+        """Replace a memory-mapped index with a private, writable copy before modifying it."""
+        if self.index_mapped:
+            self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            self.index_mapped = False
+    
+    def add(self, ids: List[int], texts: List[str], note_hashes: Optional[Dict[int, str]] = None) -> None:
+        """Embed and add new notes (or their passages). Note IDs must not already be indexed.
+
+        Pass ``note_hashes`` for chunked notes (see ``build_index``).
+        """
+        self._require_index()
+        ids = np.asarray(ids, dtype="int64")
+        duplicates = sorted(set(ids.tolist()) & self._notes)
+        if duplicates:
+            raise ValueError(f"Note IDs already indexed: {duplicates[:5]}")
+        if len(ids) == 0:
+            return
+        
+        vectors = self._prepare(self.embedding_model.encode(list(texts)))
+        next_row = int(self.row_ids.max()) + 1 if len(self.row_ids) else 0
+        row_ids = np.arange(next_row, next_row + len(ids), dtype="int64")
+        self._own_index()
+        self.index.add_with_ids(vectors, row_ids)
+        if self.lexical is not None:
+            self.lexical.add(row_ids, texts)
+        self.embeddings = np.vstack([self.embeddings, vectors])
+        self.note_ids = np.concatenate([self.note_ids, ids])
+        self.row_ids = np.concatenate([self.row_ids, row_ids])
+        self.kb_texts = list(self.kb_texts) + list(texts)
+        self._hash_notes(ids.tolist(), texts, note_hashes)
+        self._updated()
+    
+    def delete(self, ids: List[int]) -> int:
+        """Remove notes, with all their passages, by note ID. Returns the number of notes removed."""
+        self._require_index()
+        ids = np.asarray(sorted({int(i) for i in ids} & self._notes), dtype="int64")
+        if len(ids) == 0:
+            return 0
         
-        query_vec = self.embedding_model.encode_single(query)
-        D, I = self.index.search(np.array(query_vec), k)
+        removed = np.isin(self.note_ids, ids)
+        removed_rows = self.row_ids[removed]
+        keep = ~removed
+        self.embeddings = np.ascontiguousarray(self.embeddings[keep])
+        self.note_ids = self.note_ids[keep]
+        self.row_ids = self.row_ids[keep]
+        self.kb_texts = [text for text, kept in zip(self.kb_texts, keep) if kept]
+        for note_id in ids.tolist():
+            self.note_hashes.pop(note_id, None)
+        if self.lexical is not None:
+            self.lexical.delete(removed_rows)
+        try:
+            self._own_index()
+            self.index.remove_ids(faiss.IDSelectorBatch(removed_rows))
+        except RuntimeError:
+            # HNSW graphs do not support removal; rebuild from stored vectors
+            self._rebuild_index()
+        else:
+            self._updated()
+        return len(ids)
+    
+    def update(self, ids: List[int], texts: List[str], note_hashes: Optional[Dict[int, str]] = None) -> None:
+        """Re-embed changed notes in place of their previous versions."""
+        self.delete(ids)
+        self.add(ids, texts, note_hashes)
+    
+    def apply_diff(self, diff: KBDiff) -> None:
+        """Apply a KB diff, re-encoding only added/changed rows."""
+        self.delete(list(diff.removed) + diff.changed['note_id'].tolist())
+        for frame in (diff.changed, diff.added):
+            if frame.empty:
+                continue
+            note_ids, texts = self._passages(frame)
+            self.add(note_ids, texts, dict(zip(frame['note_id'].tolist(), frame['content_hash'].tolist())))
+    
+    def snapshot(self) -> Dict[int, str]:
+        """Return {note_id: content_hash} for diffing against a new KB export."""
+        return dict(self.note_hashes)
+    
+    def save(self, store: IndexStore, key: str, meta: Optional[Dict[str, Any]] = None) -> str:
+        """Persist the built index, embeddings and texts under a cache key.
+
+        The tuned search parameters and the training state are added to the
+        manifest ``meta`` so that ``load`` restores them.
+        """
+        self._require_index()
+        arrays = {"embeddings": self.embeddings, "note_ids": self.note_ids, "row_ids": self.row_ids}
+        text_data, text_offsets = pack_texts(self.kb_texts)
+        arrays.update(text_data=text_data, text_offsets=text_offsets)
+        tables = {"note_hashes": {str(k): v for k, v in self.note_hashes.items()}}
+        if self.lexical is not None:
+            lexical_arrays, lexical_tables = self.lexical.to_artifacts()
+            arrays.update(lexical_arrays)
+            tables.update(lexical_tables)
+        meta = dict(meta or {}, search_params=self.search_params, trained_rows=self.trained_rows,
+                    trained_imbalance=self.trained_imbalance)
+        return store.save(key, self.index, arrays=arrays, tables=tables, meta=meta)
+    
+    def load(self, store: IndexStore, key: str) -> bool:
+        """Load a cached index for the key. Returns False on a cache miss.
+        
+        With ``mmap`` the index and embeddings stay memory-mapped read-only, so
+        worker processes serving the same build share them through the page
+        cache; the index is copied only if it is later modified.
+        """
+        cached = store.load(key, mmap=self.mmap)
+        if cached is None:
+            return False
+        self.index = cached.index
+        self.index_mapped = self.mmap
+        self.embeddings = cached.arrays["embeddings"]
+        self.note_ids = np.asarray(cached.arrays["note_ids"])
+        self.row_ids = np.asarray(cached.arrays["row_ids"])
+        self.kb_texts = TextTable(cached.arrays["text_data"], cached.arrays["text_offsets"])
+        self.note_hashes = {int(k): v for k, v in cached.tables["note_hashes"].items()}
+        meta = cached.manifest.get("meta", {})
+        self.search_params = meta.get("search_params", {})
+        set_search_params(self.index, self.search_params)
+        self.trained_rows = meta.get("trained_rows", len(self.row_ids))
+        self.trained_imbalance = meta.get("trained_imbalance", list_imbalance(self.index))
+        if self.lexical is not None:
+            self.lexical = BM25Index.from_artifacts(cached.arrays, cached.tables)
+            if self.lexical is None:  # cached without hybrid search
+                self.lexical = BM25Index(settings.BM25_K1, settings.BM25_B)
+                self.lexical.build(self.row_ids, self.kb_texts)
+        self._reindex_positions()
+        return True
+    
+    def warm_up(self) -> None:
+        """Run one throwaway query so the first real one does not pay for lazy initialization."""
+        self._require_index()
+        probe = self.kb_texts[0][:200] if self.kb_texts else "SAP"
+        self.dense_candidates(self.encode_queries([probe]), 1)
+        if self.lexical is not None:
+            self.lexical.search(probe, 1)
+        if self.reranker is not None:
+            self.reranker.warm_up()
+    
+    def _fetch_k(self, k: int) -> int:
+        # Several passages of one note can crowd the top-k; over-fetch and dedupe
+        return k * settings.CHUNK_OVERFETCH if len(self.row_ids) > len(self._notes) else k
+    
+    @timed("faiss_search")
+    def dense_candidates(self, query_vecs: np.ndarray, k: int,
+                         min_similarity: float = -np.inf) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Dense candidates per query as (similarity, row_ids) arrays, best first.
+        
+        A top-k search is filtered to ``min_similarity`` here; a range search
+        would return, and have to sort, every passage above the cut-off.
+        Passages tied with the k-th are all fetched before the cut. Compact
+        indexes return ``settings.RESCORE_FACTOR`` times more candidates,
+        which are rescored exactly before the cut. Equal similarities are
+        ordered by note ID (see ``_best_first``).
+        """
+        fetch_k = self._fetch_k(k)
+        if self.compact:
+            return self._rescored_candidates(query_vecs, fetch_k, min_similarity)
+        D, I = self.index.search(query_vecs, fetch_k + 1)
+        candidates = []
+        for query_vec, distances, row_ids in zip(query_vecs, D, I):
+            # FAISS cuts between equal scores arbitrarily: widen until every tied passage is seen
+            similarity, width = to_similarity(distances, self.metric), fetch_k + 1
+            while (row_ids[-1] != -1 and similarity[-1] == similarity[fetch_k - 1] >= min_similarity
+                   and width < self.index.ntotal):
+                width *= 2
+                (distances,), (row_ids,) = self.index.search(query_vec[None], width)
+                similarity = to_similarity(distances, self.metric)
+            keep = (row_ids != -1) & (similarity >= min_similarity)
+            similarity, row_ids = similarity[keep], row_ids[keep]
+            order = self._best_first(similarity, row_ids)[:fetch_k]
+            candidates.append((similarity[order], row_ids[order]))
+        return candidates
+    
+    def _best_first(self, scores: np.ndarray, row_ids: np.ndarray) -> np.ndarray:
+        """Order by descending score, ties by note ID, so ranking does not depend on row order.
+        
+        Passages of one note have ascending row IDs in any build, so row ID
+        only breaks ties within a note.
+        """
+        return np.lexsort((row_ids, self.note_ids[self._positions(row_ids)], -scores))
+    
+    def _rescored_candidates(self, query_vecs: np.ndarray, fetch_k: int,
+                             min_similarity: float) -> List[Tuple[np.ndarray, np.ndarray]]:
+        # Range search is skipped: approximate distances would prune near the cut-off
+        _, I = self.index.search(query_vecs, fetch_k * settings.RESCORE_FACTOR)
+        candidates = []
+        for query_vec, row_ids in zip(query_vecs, I):
+            positions = self._positions(row_ids[row_ids != -1])
+            scores, positions = rescore(self.embeddings, query_vec, positions, fetch_k, self.metric)
+            similarity = to_similarity(scores, self.metric)
+            keep = similarity >= min_similarity
+            candidates.append((similarity[keep], self.row_ids[positions[keep]]))
+        return candidates
+    
+    def _similarity(self, pos: int, query_vec: np.ndarray) -> float:
+        """Exact similarity of one stored passage to a prepared query vector."""
+        vector = np.asarray(self.embeddings[pos])
+        if self.metric == "cosine":
+            return float(vector @ query_vec)
+        return float(to_similarity(np.sum((vector - query_vec) ** 2), self.metric))
+    
+    def _collect(self, similarity: np.ndarray, row_ids: np.ndarray, k: int,
+                 threshold: float) -> List[Tuple[str, float]]:
+        """Best passage per note, in rank order, up to k notes reaching the threshold."""
+        results, seen = [], set()
+        for confidence, row_id in zip(self.calibrator.confidence(similarity).tolist(), row_ids.tolist()):
+            if confidence < threshold:
+                continue
+            pos = int(self._positions(row_id))
+            note_id = int(self.note_ids[pos])
+            if note_id in seen:
+                continue
+            seen.add(note_id)
+            results.append((self.kb_texts[pos], confidence))
+            if len(results) == k:
+                break
+        return results
+    
+    def _note_lookup(self, query: str) -> List[Tuple[str, float]]:
+        """Lexical fast path: a bare note-number query returns that note directly."""
+        note_id = extract_note_number(query)
+        if note_id is None or note_id not in self._notes:
+            return []
+        pos = int(np.flatnonzero(self.note_ids == note_id)[0])
+        return [(self.kb_texts[pos], 1.0)]
+    
+    def _hybrid(self, query: str, query_vec: np.ndarray, similarity: np.ndarray, row_ids: np.ndarray,
+                k: int, threshold: float) -> List[Tuple[str, float]]:
+        """Reciprocal rank fusion of the dense and BM25 rankings.
+        
+        Tied scores share a rank, and fused ties go to the lower note ID, so
+        an incrementally updated index ranks like a full rebuild. Every hit
+        reports the confidence of its dense score. Lexical-only
+        candidates are scored exactly against the stored embeddings. Hits
+        that match an identifier-like query token (ST22, a note number, an
+        error ID) are kept even when their confidence misses the threshold.
+        """
+        with timed("bm25"):
+            lex_rows, lex_scores, lex_exact = self.lexical.search(query, self._fetch_k(k))
+        dense = list(zip(row_ids.tolist(), similarity.tolist()))
+        fused: Dict[int, float] = {}
+        for rank, (row_id, _) in zip(_tied_ranks(similarity.tolist()), dense):
+            fused[row_id] = 1.0 / (settings.RRF_K + rank + 1)
+        for rank, row_id in zip(_tied_ranks(lex_scores.tolist()), lex_rows.tolist()):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (settings.RRF_K + rank + 1)
+        dense_similarity = dict(dense)
+        exact_rows = set(lex_rows[lex_exact].tolist())
+        fused_rows = np.fromiter(fused, dtype="int64", count=len(fused))
+        order = self._best_first(np.fromiter(fused.values(), dtype="float64", count=len(fused)), fused_rows)
+        
+        results, seen = [], set()
+        for row_id in fused_rows[order].tolist():
+            pos = int(self._positions(row_id))
+            note_id = int(self.note_ids[pos])
+            if note_id in seen:
+                continue
+            score = dense_similarity.get(row_id)
+            if score is None:
+                score = self._similarity(pos, query_vec)
+            confidence = float(self.calibrator.confidence(score))
+            if confidence < threshold and row_id not in exact_rows:
+                continue
+            seen.add(note_id)
+            results.append((self.kb_texts[pos], confidence))
+            if len(results) == k:
+                break
+        return results
+    
+    def _depth(self, k: int) -> int:
+        """Notes ranked before the final cut; wider when a re-ranker reorders them."""
+        return max(k, self.reranker.top_n) if self.reranker is not None else k
+    
+    def _rank(self, query: str, query_vec: np.ndarray, similarity: np.ndarray, row_ids: np.ndarray,
+              k: int, threshold: float) -> List[Tuple[str, float]]:
+        depth = self._depth(k)
+        if self.lexical is None:
+            results = self._collect(similarity, row_ids, depth, threshold)
+        else:
+            results = self._hybrid(query, query_vec, similarity, row_ids, depth, threshold)
+        if self.reranker is None or len(results) < 2:
+            return results[:k]
+        # Confidences stay those of the retrieval scores; the cross-encoder only reorders
+        order = self.reranker.rerank(query, [text for text, _ in results])
+        return [results[i] for i in order[:k]]
+    
+    def _answered(self, query: str, k: int, threshold: float) -> Optional[List[Tuple[str, float]]]:
+        """Results that need no dense search: a cached result or a bare note lookup."""
+        if self.result_cache is not None:
+            cached = self.result_cache.get(query, k, threshold)
+            record_cache("search_result", cached is not None)
+            if cached is not None:
+                return list(cached)
+        results = self._note_lookup(query) if self.lexical is not None else []
+        if not results:
+            return None
+        self._remember(query, results, k, threshold)
+        return results
+    
+    def _remember(self, query: str, results: List[Tuple[str, float]], k: int, threshold: float) -> None:
+        if self.result_cache is not None:
+            self.result_cache.put(query, tuple(results), k, threshold)
+    
+    @timed("search")
+    def search(self, query: str, k: int = 3, threshold: float = 0.65) -> List[Tuple[str, float]]:
+        """Search for the top-k notes with confidence of at least ``threshold``."""
+        self._require_index()
+        results = self._answered(query, k, threshold)
+        if results is None:
+            query_vec = self._prepare(self.embedding_model.encode_single(query))
+            [(similarity, row_ids)] = self.dense_candidates(query_vec, self._depth(k),
+                                                            self.calibrator.min_score(threshold))
+            results = self._rank(query, query_vec[0], similarity, row_ids, k, threshold)
+            self._remember(query, results, k, threshold)
+        return results
+    
+    @timed("search_batch")
+    def search_batch(self, queries: List[str], k: int = 3, threshold: float = 0.65,
+                     batch_size: int = 256) -> List[List[Tuple[str, float]]]:
+        """Search many queries with batched encoding and one FAISS call.
         
-        results = []
-        for j, i in enumerate(I[0]):
-            distance = D[0][j]
-            if distance < threshold:
-                results.append((self.kb_texts[i], distance))
+        Each query is answered as ``search`` would answer it: cached results
+        and note lookups are reused, only the rest are encoded and searched.
+        """
+        self._require_index()
+        results = [self._answered(query, k, threshold) for query in queries]
+        pending = [row for row, found in enumerate(results) if found is None]
+        if not pending:
+            return results
         
-        return results
\ No newline at end of file
+        query_vecs = self.encode_queries([queries[row] for row in pending], batch_size)
+        candidates = self.dense_candidates(query_vecs, self._depth(k), self.calibrator.min_score(threshold))
+        for row, query_vec, (similarity, row_ids) in zip(pending, query_vecs, candidates):
+            results[row] = self._rank(queries[row], query_vec, similarity, row_ids, k, threshold)
+            self._remember(queries[row], results[row], k, threshold)
+        return results
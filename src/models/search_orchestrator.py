@@ -0,0 +1,181 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import TYPE_CHECKING, Callable, List, NamedTuple, Optional, Tuple, Union
+from ..config.settings import settings
+from ..utils.metrics import SEARCH_RESPONSES, record_cache, timed
+
+if TYPE_CHECKING:  # keep this module light for SearchServiceClient
+    from .index_manager import IndexManager
+    from .search_engine import SearchEngine
+    from .semantic_cache import SemanticCache
+    from ..utils.external_search import ExternalSearcher
+
+SEARCH_POLICIES = ("sequential", "speculative", "always_both")
+
+class SearchResponse(NamedTuple):
+    internal: List[Tuple[str, float]]
+    external: List[str]
+    source: str  # "internal", "external", "both", "error" (external search failed) or "none"
+    timed_out: bool
+    cached: bool = False  # answer of an earlier, near-identical query
+    error: Optional[str] = None  # why external search failed, safe to show to users
+
+def _external_error(error: Exception) -> str:
+    from ..utils.external_search import ExternalSearchError
+    return str(error) if isinstance(error, ExternalSearchError) else "External search failed: unexpected error"
+
+class SearchOrchestrator:
+    """Runs the internal KB search and the external fallback under one latency budget.
+
+    Policies:
+      - sequential: external search starts only after an internal miss.
+      - speculative: both start together; the external result is dropped
+        (or its call cancelled if not yet started) on a confident internal hit.
+      - always_both: both run concurrently and both results are returned.
+
+    Internal and external calls run on separate thread pools. A call that
+    misses the deadline keeps running in the background (a thread cannot be
+    interrupted), so the external pool is bounded: while all its workers are
+    busy with slow upstream calls, queries skip external search instead of
+    queueing behind them, and internal search is never held up.
+
+    ``search_engine`` may be an ``IndexManager``; each query then runs on the
+    engine that is active when it starts, even if a reload swaps it mid-query.
+
+    Complete responses are kept in a ``SemanticCache``: a paraphrase of a
+    recent query gets the same response without a search. Cached responses
+    are dropped whenever the index changes or a new version is swapped in.
+    """
+
+    def __init__(self, search_engine: Union["SearchEngine", "IndexManager"],
+                 external_searcher: "ExternalSearcher",
+                 policy: Optional[str] = None, latency_budget: Optional[float] = None,
+                 max_workers: int = 8, answer_cache: Optional["SemanticCache"] = None,
+                 external_workers: Optional[int] = None):
+        self._search_engine = search_engine
+        self.external_searcher = external_searcher
+        self.policy = policy or settings.SEARCH_POLICY
+        if self.policy not in SEARCH_POLICIES:
+            raise ValueError(f"Unknown search policy '{self.policy}'. Expected one of {SEARCH_POLICIES}")
+        self.latency_budget = latency_budget if latency_budget is not None else settings.SEARCH_LATENCY_BUDGET
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        external_workers = external_workers or settings.EXTERNAL_SEARCH_WORKERS
+        self._external_executor = ThreadPoolExecutor(max_workers=external_workers, thread_name_prefix="external")
+        self._external_slots = threading.BoundedSemaphore(external_workers)
+        if answer_cache is None and settings.SEMANTIC_CACHE_SIZE > 0:
+            from .semantic_cache import SemanticCache
+            answer_cache = SemanticCache()
+        self.answer_cache = answer_cache
+
+    @property
+    def index_manager(self) -> Optional["IndexManager"]:
+        return self._search_engine if hasattr(self._search_engine, "engine") else None
+
+    @property
+    def search_engine(self) -> "SearchEngine":
+        index_manager = self.index_manager
+        return index_manager.engine if index_manager is not None else self._search_engine
+
+    def search(self, query: str, k: int = 3, threshold: float = 0.65) -> SearchResponse:
+        with timed("request"):
+            response = self._cached_search(query, k, threshold)
+        SEARCH_RESPONSES.inc(source=response.source)
+        return response
+
+    def _cached_search(self, query: str, k: int, threshold: float) -> SearchResponse:
+        search_engine = self.search_engine
+        if self.answer_cache is None or not self.answer_cache.accepts(query):
+            return self._search(search_engine, query, k, threshold)
+        answer_cache, generation = self.answer_cache, search_engine.generation
+        query_vecs = []
+
+        def lookup_then_search():
+            # Encoding is part of the internal search, so it runs under the latency budget
+            with timed("semantic_cache"):
+                # The engine's search reuses this embedding from the query embedding cache
+                query_vec = search_engine.embedding_model.encode_single(query)
+                cached = answer_cache.get(query, query_vec, generation, k, threshold)
+            record_cache("semantic_answer", cached is not None)
+            query_vecs.append(query_vec)
+            if cached is not None:
+                return cached._replace(cached=True)
+            return search_engine.search(query, k, threshold)
+
+        response = self._search(search_engine, query, k, threshold, internal_task=lookup_then_search)
+        if not response.cached and query_vecs and self._complete(response):
+            answer_cache.put(query, query_vecs[0], response, generation, k, threshold)
+        return response
+
+    @staticmethod
+    def _complete(response: SearchResponse) -> bool:
+        """Whether a response is worth reusing: nothing timed out and external search did not fail."""
+        return not response.timed_out and response.error is None
+
+    def _search(self, search_engine: "SearchEngine", query: str, k: int, threshold: float,
+                internal_task: Optional[Callable[[], Union[List[Tuple[str, float]], SearchResponse]]] = None
+                ) -> SearchResponse:
+        """Run the policy. ``internal_task`` replaces the KB search and may answer with a whole response."""
+        deadline = time.monotonic() + self.latency_budget
+        if internal_task is None:
+            internal_future = self._executor.submit(search_engine.search, query, k, threshold)
+        else:
+            internal_future = self._executor.submit(internal_task)
+        external_future: Optional[Future] = None
+        if self.policy != "sequential":
+            external_future = self._submit_external(query)
+
+        internal, internal_timed_out = self._wait(internal_future, deadline, default=[])
+        if isinstance(internal, SearchResponse):  # answered from the semantic cache
+            if external_future is not None:
+                external_future.cancel()
+            return internal
+        if internal and self.policy != "always_both":
+            if external_future is not None:
+                external_future.cancel()
+            return SearchResponse(internal, [], "internal", internal_timed_out)
+
+        if external_future is None:
+            if time.monotonic() >= deadline:
+                return SearchResponse(internal, [], "none", True)
+            external_future = self._submit_external(query)
+        external, external_timed_out, error = [], True, None  # no external worker free: every one is stuck upstream
+        if external_future is not None:
+            try:
+                external, external_timed_out = self._wait(external_future, deadline, default=[])
+            except Exception as e:
+                external_timed_out, error = False, _external_error(e)
+
+        if internal and external:
+            source = "both"
+        elif internal:
+            source = "internal"
+        elif external:
+            source = "external"
+        elif error is not None:
+            source = "error"
+        else:
+            source = "none"
+        return SearchResponse(internal, external, source, internal_timed_out or external_timed_out, error=error)
+
+    def _submit_external(self, query: str) -> Optional[Future]:
+        """Start an external search, or return None if all external workers are busy."""
+        if not self._external_slots.acquire(blocking=False):
+            return None
+        future = self._external_executor.submit(self.external_searcher.search_links, query)
+        # Released when the call finishes, or at once if it is cancelled before it starts
+        future.add_done_callback(lambda _: self._external_slots.release())
+        return future
+
+    @staticmethod
+    def _wait(future: Future, deadline: float, default):
+        """Return (result, timed_out), giving up on the future at the deadline."""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic())), False
+        except FutureTimeout:
+            future.cancel()
+            return default, True
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._external_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+"""
+Semantic answer cache for near-duplicate queries.
+
+Tickets are often paraphrases of a question answered minutes ago. The cache
+keeps the final answers to recent queries in a small inner-product index of
+their embeddings; a new query whose embedding lies within the similarity
+radius of a cached one gets that answer back without a KB search or an
+external call. Identifiers that embeddings blur (ST22 vs SM21, note and
+error numbers) must match exactly for a hit.
+"""
+
+import threading
+import time
+import faiss
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, NamedTuple, Optional, Tuple
+from .lexical_index import extract_note_number, is_exact_token, tokenize
+from ..config.settings import settings
+
+NEIGHBOURS = 8  # cached queries checked per lookup, nearest first
+
+class _Entry(NamedTuple):
+    identifiers: FrozenSet[str]
+    extra: Tuple[Hashable, ...]
+    value: Any
+    created: float
+
+def _identifiers(query: str) -> FrozenSet[str]:
+    # Any number counts here: "printer 1" and "printer 2" are different questions
+    return frozenset(token for token in tokenize(query)
+                     if is_exact_token(token) or any(c.isdigit() for c in token))
+
+class SemanticCache:
+    """Thread-safe LRU cache of answers, looked up by query embedding similarity, with optional TTL.
+
+    ``version`` identifies the index state the answers were computed from;
+    the first lookup or insert with a different version drops every entry.
+    Extra key parts (k, threshold) must match exactly.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None,
+                 min_similarity: Optional[float] = None):
+        self.max_size = max_size if max_size is not None else settings.SEMANTIC_CACHE_SIZE
+        self.ttl = (ttl if ttl is not None else settings.SEMANTIC_CACHE_TTL) or None
+        self.min_similarity = min_similarity if min_similarity is not None else settings.SEMANTIC_CACHE_SIMILARITY
+        self._index: Optional[faiss.IndexIDMap2] = None
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def accepts(query: str) -> bool:
+        """Bare note lookups are answered without encoding the query; caching them would cost more."""
+        return extract_note_number(query) is None
+
+    @staticmethod
+    def _prepare(vector: np.ndarray) -> np.ndarray:
+        vector = np.array(vector, dtype="float32", order="C", ndmin=2)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _check_version(self, version: Hashable) -> None:
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._clear()
+            self._version = version
+
+    def _remove(self, entry_id: int) -> None:
+        del self._entries[entry_id]
+        self._index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def get(self, query: str, vector: np.ndarray, version: Hashable, *extra: Hashable) -> Optional[Any]:
+        """Return the answer to the most similar cached query within the radius, or None."""
+        vector = self._prepare(vector)
+        wanted = _identifiers(query)
+        with self._lock:
+            self._check_version(version)
+            if self._entries:
+                now = time.monotonic()
+                similarities, entry_ids = self._index.search(vector, min(NEIGHBOURS, len(self._entries)))
+                for similarity, entry_id in zip(similarities[0].tolist(), entry_ids[0].tolist()):
+                    if entry_id == -1 or similarity < self.min_similarity:
+                        break
+                    entry = self._entries[entry_id]
+                    if self.ttl is not None and now - entry.created > self.ttl:
+                        self._remove(entry_id)
+                        continue
+                    if entry.extra == extra and entry.identifiers == wanted:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        return entry.value
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vector: np.ndarray, value: Any, version: Hashable, *extra: Hashable) -> None:
+        if self.max_size <= 0:
+            return
+        vector = self._prepare(vector)
+        with self._lock:
+            self._check_version(version)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = _Entry(_identifiers(query), extra, value, time.monotonic())
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        if self._index is not None:
+            self._index.reset()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for sizing the cache and tuning the radius."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,149 @@
+"""
+Checkpointed, optionally multi-process passage encoding for index builds.
+
+Passages are cut into fixed-size shards in KB order. Each shard is stored
+under a name derived from the model and the shard's own texts, so an
+interrupted build that is started again finds the shards it already
+finished and encodes only the rest, and a KB export that changed near the
+end re-encodes only the shards it touched. With several workers, shards are
+encoded by separate processes, each with its own model copy and thread
+count, while the KB is still being read.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from ..config.settings import settings
+from ..utils.metrics import timed
+
+_worker_model = None
+
+def _init_worker(model_factory: Callable[[], object], threads: int) -> None:
+    global _worker_model
+    if threads > 0:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    _worker_model = model_factory()
+
+def _save_atomic(path: str, vectors: np.ndarray) -> None:
+    fd, tmp_path = tempfile.mkstemp(suffix=".npy", prefix=".shard-", dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        np.save(f, np.ascontiguousarray(vectors, dtype="float32"))
+    os.replace(tmp_path, path)
+
+def _encode_shard(path: str, texts: List[str]) -> str:
+    """Worker task: encode one shard and write it to ``path``."""
+    _save_atomic(path, _worker_model.encode(texts))
+    return path
+
+class ShardedEmbedder:
+    """Encode passages shard by shard, checkpointing each finished shard to disk.
+
+    Feed texts with ``add`` as KB batches arrive; ``finish`` returns the
+    embeddings of all texts in order. ``workers > 1`` needs a model with a
+    picklable ``worker_factory()`` (see ``EmbeddingModel``); otherwise
+    shards are encoded in this process.
+    """
+
+    def __init__(self, embedding_model, workers: Optional[int] = None, shard_rows: Optional[int] = None,
+                 threads: Optional[int] = None, checkpoint_dir: Optional[str] = None,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        self.embedding_model = embedding_model
+        self.workers = workers if workers is not None else settings.EMBED_WORKERS
+        self.shard_rows = shard_rows or settings.EMBED_SHARD_ROWS
+        threads = threads if threads is not None else settings.EMBED_THREADS
+        self.threads = threads or max(1, (os.cpu_count() or 1) // max(self.workers, 1))
+        self.checkpoint_dir = os.path.join(checkpoint_dir or settings.EMBED_CHECKPOINT_DIR,
+                                           embedding_model.cache_id.replace("/", "__"))
+        self.progress = progress
+        self.reused = 0  # shards found on disk from an earlier, interrupted build
+        self._pending: List[str] = []
+        self._shards: List[Tuple[str, Optional[Future]]] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        factory = getattr(embedding_model, "worker_factory", None)
+        self._factory = factory() if factory is not None and self.workers > 1 else None
+
+    def _shard_path(self, texts: List[str]) -> str:
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        return os.path.join(self.checkpoint_dir, f"{digest.hexdigest()[:32]}.npy")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs torch threads can deadlock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._factory, self.threads)
+            )
+        return self._executor
+
+    def _submit(self, texts: List[str]) -> None:
+        path = self._shard_path(texts)
+        future: Optional[Future] = None
+        if os.path.exists(path):
+            self.reused += 1
+        elif self._factory is not None:
+            future = self._pool().submit(_encode_shard, path, texts)
+        else:
+            _save_atomic(path, self.embedding_model.encode(texts))
+        self._shards.append((path, future))
+        self._report()
+
+    def _report(self) -> None:
+        if self.progress is not None:
+            done = sum(1 for _, future in self._shards if future is None or future.done())
+            self.progress(done, len(self._shards))
+
+    def add(self, texts: List[str]) -> None:
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._pending.extend(texts)
+        while len(self._pending) >= self.shard_rows:
+            shard, self._pending = self._pending[:self.shard_rows], self._pending[self.shard_rows:]
+            self._submit(shard)
+
+    @timed("embed_shards")
+    def finish(self) -> Optional[np.ndarray]:
+        """Encode the last partial shard, wait for the workers and return all embeddings in order."""
+        if self._pending:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            self._submit(self._pending)
+            self._pending = []
+        try:
+            for _, future in self._shards:
+                if future is not None:
+                    future.result()
+                    self._report()
+        finally:
+            self.close()
+        if not self._shards:
+            return None
+        return np.concatenate([np.load(path) for path, _ in self._shards])
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def cleanup(self) -> None:
+        """Delete this build's shards once the index has been built from them."""
+        for path, _ in self._shards:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        try:
+            os.rmdir(self.checkpoint_dir)
+        except OSError:
+            pass  # still holds shards of another build
@@ -0,0 +1,155 @@
+"""
+Headless HTTP query service over the search components.
+
+The model and index load once per worker at startup; KB changes are picked
+up by a background rebuild and swapped in without a restart. With
+FAST_START the worker accepts requests at once and answers 503 until the
+background load finishes. Run with ``python serve.py`` or
+``uvicorn src.server:app --workers N``.
+"""
+
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, List, Optional
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
+from .config.settings import settings
+from .models.search_orchestrator import SearchOrchestrator
+from .utils.metrics import CONTENT_TYPE, REGISTRY
+from .utils.warmup import start_warmup
+
+if TYPE_CHECKING:  # loaded with the model, not at import
+    from .models.index_manager import IndexManager
+
+class SearchRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    k: Optional[int] = Field(None, ge=1, le=100)
+    threshold: Optional[float] = Field(None, ge=0, le=1)  # minimum confidence
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., max_length=10000)
+    k: Optional[int] = Field(None, ge=1, le=100)
+    threshold: Optional[float] = Field(None, ge=0, le=1)
+
+class Hit(BaseModel):
+    text: str
+    confidence: float
+
+class SearchResult(BaseModel):
+    query: str
+    source: str
+    timed_out: bool = False
+    cached: bool = False
+    internal: List[Hit]
+    external: List[str] = []
+    error: Optional[str] = None  # set when external search failed (source "error" if nothing else answered)
+
+class BatchSearchResult(BaseModel):
+    results: List[SearchResult]
+
+def _hits(results) -> List[Hit]:
+    return [Hit(text=text, confidence=float(confidence)) for text, confidence in results]
+
+def _load_components(app: FastAPI, started: float) -> None:
+    from .models.embedding_model import EmbeddingModel
+    from .models.index_manager import IndexManager
+    from .utils.external_search import ExternalSearcher
+
+    index_manager = IndexManager(EmbeddingModel(settings.EMBEDDING_MODEL))
+    index_manager.load()
+    index_manager.start()
+    app.state.orchestrator = SearchOrchestrator(index_manager, ExternalSearcher())
+    app.state.startup_seconds = time.monotonic() - started
+    app.state.index_manager = index_manager  # set last: requests treat it as the ready flag
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.monotonic()
+    app.state.index_manager = None
+    app.state.warmup = start_warmup(lambda: _load_components(app, started))
+    if not settings.FAST_START:
+        app.state.warmup.result()
+    yield
+    if app.state.index_manager is not None:
+        app.state.index_manager.stop()
+        app.state.orchestrator.shutdown()
+
+app = FastAPI(title=settings.APP_TITLE, description=settings.APP_DESCRIPTION, lifespan=lifespan)
+
+def _index_manager() -> "IndexManager":
+    """The loaded index manager, or a 503 while the worker is still warming up."""
+    index_manager = getattr(app.state, "index_manager", None)
+    if index_manager is None:
+        warmup = getattr(app.state, "warmup", None)
+        if warmup is not None and warmup.done() and warmup.exception() is not None:
+            raise HTTPException(status_code=503, detail=f"Index failed to load: {warmup.exception()}")
+        raise HTTPException(status_code=503, detail="Warming up", headers={"Retry-After": "5"})
+    return index_manager
+
+@app.get("/healthz")
+def healthz():
+    index_manager = _index_manager()
+    search_engine = index_manager.engine
+    batcher = search_engine.embedding_model.batcher
+    answer_cache = app.state.orchestrator.answer_cache
+    return {
+        "status": "ok",
+        "model": search_engine.embedding_model.cache_id,
+        "index_type": search_engine.index_type,
+        "metric": search_engine.metric,
+        "index_mapped": search_engine.index_mapped,
+        "calibrated": search_engine.calibrator.fitted,
+        "documents": len(search_engine.kb_texts),
+        "index_version": index_manager.version.key,
+        "startup_seconds": round(app.state.startup_seconds, 3),
+        "embedding_batcher": batcher.stats() if batcher is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+    }
+
+@app.get("/index")
+def index_status():
+    """Active index version, when it went live and how long it took to build."""
+    return _index_manager().status()
+
+@app.post("/index/reload")
+def index_reload():
+    """Rebuild from the current KB file now instead of waiting for the poller."""
+    index_manager = _index_manager()
+    reloaded = index_manager.refresh(force=True)
+    return {"reloaded": reloaded, **index_manager.status()}
+
+@app.get("/metrics")
+def metrics() -> Response:
+    # Per process: with SERVICE_WORKERS > 1 each worker reports its own counters
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.post("/search", response_model=SearchResult)
+def search(request: SearchRequest) -> SearchResult:
+    _index_manager()  # 503 until loaded
+    response = app.state.orchestrator.search(
+        request.query,
+        k=request.k or settings.TOP_K_RESULTS,
+        threshold=request.threshold if request.threshold is not None else settings.SIMILARITY_THRESHOLD
+    )
+    return SearchResult(
+        query=request.query,
+        source=response.source,
+        timed_out=response.timed_out,
+        cached=response.cached,
+        internal=_hits(response.internal),
+        external=response.external,
+        error=response.error
+    )
+
+@app.post("/search/batch", response_model=BatchSearchResult)
+def search_batch(request: BatchSearchRequest) -> BatchSearchResult:
+    """Internal-KB search for many queries; no external fallback."""
+    results = _index_manager().engine.search_batch(
+        request.queries,
+        k=request.k or settings.TOP_K_RESULTS,
+        threshold=request.threshold if request.threshold is not None else settings.SIMILARITY_THRESHOLD
+    )
+    return BatchSearchResult(results=[
+        SearchResult(query=query, source="internal" if hits else "none", internal=_hits(hits))
+        for query, hits in zip(request.queries, results)
+    ])
@@ -1,16 +1,279 @@
+import hashlib
+import os
 import pandas as pd
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from .metrics import timed
+from .text_spans import TokenSpans, word_spans
+
+# Identifies how 'combined_text' is built; part of the index cache key, so
+# bump it whenever combine_text() changes.
+COMBINED_TEXT_RULE = "title. description/v1"
+
+# Columns that may carry an SAP note number, checked in order.
+NOTE_ID_COLUMNS = ['Note ID', 'Note Number', 'SAP Note']
+
+KB_COLUMNS = ['Note Title', 'Description']
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+ARROW_FORMATS = {'.parquet': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+class KBDiff(NamedTuple):
+    added: pd.DataFrame
+    changed: pd.DataFrame
+    removed: List[int]
+
+    @property
+    def is_empty(self) -> bool:
+        return self.added.empty and self.changed.empty and not self.removed
+
+def _as_text(column: pd.Series) -> pd.Series:
+    # Spreadsheet cells may hold numbers or dates; missing cells become empty text
+    return column.map(lambda value: "" if pd.isna(value) else str(value))
+
+def combine_text(df: pd.DataFrame) -> pd.Series:
+    """Build the text that gets embedded for each note."""
+    return _as_text(df['Note Title']) + ". " + _as_text(df['Description'])
+
+def content_hash(text: str) -> str:
+    """Hash a note's combined text to detect changed rows."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _stable_id(value: str) -> int:
+    # 63 bits so the ID fits FAISS's signed int64 labels
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big") >> 1
+
+class NoteIdAssigner:
+    """Derive a stable int64 ID per note, across the batches of one KB.
+
+    Uses the SAP note number when the sheet has one; otherwise hashes the note
+    title, so IDs survive row reordering between exports. Missing, invalid and
+    repeated note numbers fall back to hashing the key with its occurrence
+    count.
+    """
+
+    def __init__(self):
+        self._numbers: Set[int] = set()
+        self._occurrences: Dict[str, int] = {}
+
+    def __call__(self, df: pd.DataFrame) -> pd.Series:
+        id_column = next((col for col in NOTE_ID_COLUMNS if col in df.columns), None)
+        source = df[id_column] if id_column is not None else df['Note Title']
+        numbers = pd.to_numeric(source, errors='coerce') if id_column is not None else pd.Series(float('nan'), index=df.index)
+        ids = []
+        for key, number in zip(source.astype(str).tolist(), numbers.tolist()):
+            n = self._occurrences.get(key, 0)
+            self._occurrences[key] = n + 1
+            if number == number and number >= 0 and float(number).is_integer() and int(number) not in self._numbers:
+                self._numbers.add(int(number))
+                ids.append(int(number))
+            else:
+                ids.append(_stable_id(f"{key}\0{n}"))
+        return pd.Series(ids, index=df.index, dtype='int64')
+
+def assign_note_ids(df: pd.DataFrame) -> pd.Series:
+    """Derive a stable int64 ID per note of a fully loaded KB."""
+    return NoteIdAssigner()(df)
+
+def _kb_columns(columns: Iterable[Any]) -> List[str]:
+    """Columns ingestion keeps: title, description and the first note-number column."""
+    columns = [str(col) for col in columns]
+    missing = [col for col in KB_COLUMNS if col not in columns]
+    if missing:
+        raise ValueError(f"Knowledge base is missing columns: {', '.join(missing)}")
+    return KB_COLUMNS + [col for col in NOTE_ID_COLUMNS if col in columns][:1]
+
+def _excel_batches(filepath: str, batch_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of building the cell tree
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = ["" if col is None else str(col) for col in header]
+        columns = _kb_columns(header)
+        positions = [header.index(col) for col in columns]
+        batch = []
+        for row in rows:
+            batch.append([row[i] if i < len(row) else None for i in positions])
+            if len(batch) == batch_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+def _csv_batches(filepath: str, batch_rows: int) -> Iterator[pd.DataFrame]:
+    columns = _kb_columns(pd.read_csv(filepath, nrows=0).columns)
+    yield from pd.read_csv(filepath, usecols=columns, chunksize=batch_rows)
+
+def _arrow_batches(filepath: str, batch_rows: int, file_format: str) -> Iterator[pd.DataFrame]:
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(filepath, format=file_format)
+    columns = _kb_columns(dataset.schema.names)
+    for record_batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+        yield record_batch.to_pandas()
+
+def read_kb_batches(filepath: str, batch_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    """Stream raw KB rows in batches from Excel, CSV, Parquet or Feather/Arrow.
+
+    Only the title, description and note-number columns are read.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in EXCEL_EXTENSIONS:
+        return _excel_batches(filepath, batch_rows)
+    if ext == '.csv':
+        return _csv_batches(filepath, batch_rows)
+    if ext in ARROW_FORMATS:
+        return _arrow_batches(filepath, batch_rows, ARROW_FORMATS[ext])
+    raise ValueError(f"Unsupported knowledge base format: {ext or filepath}")
+
+def prepare_batch(batch: pd.DataFrame, assign: NoteIdAssigner) -> pd.DataFrame:
+    """Drop incomplete rows and add the ``combined_text``, ``note_id`` and ``content_hash`` columns.
+
+    ``assign`` is shared by all batches of one KB.
+    """
+    batch = batch.dropna(subset=KB_COLUMNS).copy()
+    if not batch.empty:
+        for col in KB_COLUMNS:
+            batch[col] = _as_text(batch[col])
+        batch['combined_text'] = combine_text(batch)
+        batch['note_id'] = assign(batch)
+        batch['content_hash'] = batch['combined_text'].map(content_hash)
+    return batch
+
+def iter_kb(filepath: str, batch_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    """Stream the KB as prepared batches (see ``load_kb`` for the columns added).
+
+    Row labels continue across batches, matching a single full load.
+    """
+    assign = NoteIdAssigner()
+    offset = 0
+    batches = read_kb_batches(filepath, batch_rows)
+    while True:
+        with timed("load_kb"):
+            batch = next(batches, None)
+            if batch is None:
+                return
+            batch.index = pd.RangeIndex(offset, offset + len(batch))
+            offset += len(batch)
+            batch = prepare_batch(batch, assign)
+        if not batch.empty:
+            yield batch
 
 def load_kb(filepath: str) -> pd.DataFrame:
-    """Load knowledge base from Excel file."""
+    """Load knowledge base from an Excel, CSV, Parquet or Feather file."""
     try:
-        df = pd.read_excel(filepath)
-        df = df.dropna(subset=['Note Title', 'Description'])
-        df['combined_text'] = df['Note Title'] + ". " + df['Description']
-        return df
+        batches = list(iter_kb(filepath))
+        if not batches:
+            return pd.DataFrame(columns=KB_COLUMNS + ['combined_text', 'note_id', 'content_hash'])
+        return pd.concat(batches)
     except Exception as e:
         raise Exception(f"Error loading knowledge base: {str(e)}")
 
+def convert_kb(filepath: str, target: str, batch_rows: int = 5000) -> str:
+    """Convert a KB export to Parquet, streaming, for fast columnar reloads.
+
+    Cells are stored as strings so the schema is stable across batches; the
+    file is written under a temporary name and moved into place.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    tmp_path = f"{target}.tmp"
+    writer = None
+    try:
+        for batch in read_kb_batches(filepath, batch_rows):
+            if writer is None:
+                schema = pa.schema([(str(col), pa.string()) for col in batch.columns])
+                writer = pq.ParquetWriter(tmp_path, schema)
+            cells = {col: [None if pd.isna(v) else str(v) for v in batch[col].tolist()] for col in batch.columns}
+            writer.write_table(pa.table(cells, schema=schema))
+        if writer is None:
+            raise ValueError(f"Knowledge base is empty: {filepath}")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, target)
+        return target
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _split_known(previous_hashes: pd.Series, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    known = df['note_id'].isin(previous_hashes.index)
+    added = df[~known]
+    existing = df[known]
+    changed = existing[existing['content_hash'].values != previous_hashes.loc[existing['note_id']].values]
+    return added, changed
+
+def diff_kb(previous: Dict[int, str], df: pd.DataFrame) -> KBDiff:
+    """Compare a loaded KB against a {note_id: content_hash} snapshot."""
+    added, changed = _split_known(pd.Series(previous, dtype=object), df)
+    removed = sorted(set(previous) - set(df['note_id'].tolist()))
+    return KBDiff(added=added, changed=changed, removed=removed)
+
+def diff_kb_batches(previous: Dict[int, str], batches: Iterable[pd.DataFrame]) -> KBDiff:
+    """Streaming ``diff_kb``: only added/changed rows are kept in memory."""
+    previous_hashes = pd.Series(previous, dtype=object)
+    added, changed, seen = [], [], set()
+    empty = None
+    for batch in batches:
+        batch_added, batch_changed = _split_known(previous_hashes, batch)
+        added.append(batch_added)
+        changed.append(batch_changed)
+        seen.update(batch['note_id'].tolist())
+        if empty is None:
+            empty = batch.iloc[0:0]
+    if empty is None:
+        empty = pd.DataFrame(columns=KB_COLUMNS + ['combined_text', 'note_id', 'content_hash'])
+    return KBDiff(
+        added=pd.concat(added) if added else empty,
+        changed=pd.concat(changed) if changed else empty,
+        removed=sorted(set(previous) - seen)
+    )
+
+def chunk_rule(max_tokens: int, overlap: int) -> str:
+    """Identifies the passage layout; part of the index cache key."""
+    return f"{COMBINED_TEXT_RULE}|chunks={max_tokens}/{overlap}" if max_tokens > 0 else COMBINED_TEXT_RULE
+
+def iter_passages(notes: Iterable[Tuple[int, str, str]], max_tokens: int, overlap: int = 0,
+                  token_spans: Optional[TokenSpans] = None) -> Iterator[Tuple[int, int, str]]:
+    """Split (note_id, title, description) rows into overlapping passages.
+
+    Yields (note_id, chunk_no, text). Each passage is prefixed with the note
+    title; a description that fits in ``max_tokens`` yields one passage equal
+    to the note's combined text.
+    """
+    token_spans = token_spans or word_spans
+    step = max(1, max_tokens - overlap)
+    for note_id, title, description in notes:
+        spans = token_spans(description) if max_tokens > 0 else []
+        if len(spans) <= max_tokens or max_tokens <= 0:
+            yield note_id, 0, f"{title}. {description}"
+            continue
+        for chunk_no, start in enumerate(range(0, len(spans), step)):
+            end = min(start + max_tokens, len(spans))
+            yield note_id, chunk_no, f"{title}. {description[spans[start][0]:spans[end - 1][1]]}"
+            if end == len(spans):
+                break
+
+def kb_passages(df: pd.DataFrame, max_tokens: int = 0, overlap: int = 0,
+                token_spans: Optional[TokenSpans] = None) -> Tuple[List[int], List[str]]:
+    """Return parallel lists of note IDs and passage texts for a loaded KB."""
+    notes = zip(df['note_id'].tolist(), df['Note Title'].tolist(), df['Description'].tolist())
+    note_ids, texts = [], []
+    for note_id, _, text in iter_passages(notes, max_tokens, overlap, token_spans):
+        note_ids.append(note_id)
+        texts.append(text)
+    return note_ids, texts
+
 def validate_kb_structure(df: pd.DataFrame) -> bool:
     """Validate that the knowledge base has required columns."""
     required_columns = ['Note Title', 'Description']
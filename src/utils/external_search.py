@@ -1,29 +1,132 @@
+import logging
+import threading
 import requests
-from typing import List, Dict, Any
+from concurrent.futures import Future
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Optional, Union
+from .response_cache import ResponseCache
 from ..config.settings import settings
+from .metrics import SERPAPI_ERRORS, record_cache, timed
+from ..models.query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+class ExternalSearchError(Exception):
+    """External search failed. The message is safe to show to users: it names the
+    kind of failure but never includes upstream URLs or exception text."""
+
+def _describe(error: Exception) -> str:
+    # With retries enabled, a read timeout surfaces as a ConnectionError around urllib3's error
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    if isinstance(error, requests.Timeout) or isinstance(reason, ReadTimeoutError):
+        return "SerpAPI did not answer in time"
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f"SerpAPI returned HTTP {error.response.status_code}"
+    if isinstance(error, requests.ConnectionError):
+        return "could not connect to SerpAPI"
+    if isinstance(error, ValueError):
+        return "SerpAPI returned an unreadable response"
+    return "unexpected error"
 
 class ExternalSearcher:
-    def __init__(self, api_key: str = None):
+    """SerpAPI client with a pooled, retrying session and a response cache.
+
+    ``cache=None`` opens the shared on-disk cache at ``settings.SERPAPI_CACHE_PATH``
+    (unless ``SERPAPI_CACHE_TTL`` is 0); ``cache=False`` disables caching.
+    """
+
+    def __init__(self, api_key: str = None, base_url: Optional[str] = None,
+                 cache: Union[ResponseCache, bool, None] = None, session: Optional[requests.Session] = None):
         self.api_key = api_key or settings.SERPAPI_KEY
-    
+        self.base_url = base_url or settings.SERPAPI_URL
+        self.timeout = (settings.SERPAPI_CONNECT_TIMEOUT, settings.SERPAPI_READ_TIMEOUT)
+        self.session = session or self._create_session()
+        if cache is None and settings.SERPAPI_CACHE_TTL > 0:
+            cache = ResponseCache(settings.SERPAPI_CACHE_PATH, settings.SERPAPI_CACHE_TTL)
+        self.cache: Optional[ResponseCache] = None if cache is False else cache
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    @staticmethod
+    def _create_session() -> requests.Session:
+        """Pooled session that retries connection errors and 429/5xx with backoff."""
+        retry = Retry(
+            total=settings.SERPAPI_RETRIES,
+            backoff_factor=settings.SERPAPI_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=16)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
     def search(self, query: str, num_results: int = 3) -> List[str]:
-        """Search using SerpAPI."""
+        """Search using SerpAPI. A failure comes back as a single message line."""
+        try:
+            return self.search_links(query, num_results)
+        except ExternalSearchError as e:
+            return [str(e)]
+
+    def search_links(self, query: str, num_results: int = 3) -> List[str]:
+        """Search using SerpAPI; raises ``ExternalSearchError`` on failure."""
         if not self.api_key:
-            return ["External search failed: API key not configured"]
-        
+            raise ExternalSearchError("External search failed: API key not configured")
+
         try:
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self.api_key,
-                "num": num_results
-            }
-            
-            response = requests.get("https://serpapi.com/search", params=params)
-            response.raise_for_status()
-            
-            results = response.json().get("organic_results", [])
-            return [f"{res['title']}: {res['link']}" for res in results]
-            
+            with timed("external_search"):
+                return self._search_cached(query, num_results)
         except Exception as e:
-            return [f"External search failed: {str(e)}"]
\ No newline at end of file
+            SERPAPI_ERRORS.inc(error=type(e).__name__)
+            # Request errors echo the URL; keep the API key out of the log
+            logger.warning("SerpAPI call failed: %s", str(e).replace(self.api_key, "***"))
+            raise ExternalSearchError(f"External search failed: {_describe(e)}") from None
+
+    def _search_cached(self, query: str, num_results: int) -> List[str]:
+        key = f"google|{num_results}|{normalize_query(query)}"
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            record_cache("serpapi", cached is not None)
+            if cached is not None:
+                return cached
+
+        # Coalesce concurrent identical queries onto one upstream call
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            return future.result()
+
+        try:
+            results = self._fetch(query, num_results)
+            if self.cache is not None:
+                self.cache.put(key, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def _fetch(self, query: str, num_results: int) -> List[str]:
+        params = {
+            "engine": "google",
+            "q": query,
+            "api_key": self.api_key,
+            "num": num_results
+        }
+
+        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+
+        results = response.json().get("organic_results", [])
+        return [f"{res['title']}: {res['link']}" for res in results]
@@ -0,0 +1,250 @@
+"""
+Lightweight in-process metrics with optional OpenTelemetry spans.
+
+Pipeline stages are timed with ``timed("stage")`` into one latency histogram;
+counters track cache hits, answering sources and SerpAPI errors. Everything
+renders in the Prometheus text format for a ``/metrics`` scrape endpoint,
+and ``stage_summary`` feeds the UI.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from ..config.settings import settings
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (last slot is +Inf), sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[slot] += 1
+            total[0] += value
+
+    def summary(self, **labels: str) -> Dict[str, float]:
+        """Count, mean and bucket-interpolated p50/p95 for one label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            counts, total = (list(series[0]), series[1][0]) if series else ([], 0.0)
+        n = sum(counts)
+        if n == 0:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+        return {"count": n, "mean": total / n, "p50": self._quantile(counts, n, 0.5),
+                "p95": self._quantile(counts, n, 0.95)}
+
+    def _quantile(self, counts: List[int], n: int, q: float) -> float:
+        rank, seen = q * n, 0
+        for slot, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[slot - 1] if slot > 0 else 0.0
+                upper = self.buckets[slot] if slot < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def label_sets(self) -> List[Labels]:
+        with self._lock:
+            return sorted(self._series)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in self._series.items()}
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("sap_stage_duration_seconds", "Time spent per pipeline stage.", ("stage",))
+CACHE_LOOKUPS = REGISTRY.counter("sap_cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result"))
+SEARCH_RESPONSES = REGISTRY.counter("sap_search_responses_total", "Search responses by answering source.", ("source",))
+SERPAPI_ERRORS = REGISTRY.counter("sap_serpapi_errors_total", "Failed SerpAPI calls by error type.", ("error",))
+RERANK_DEGRADED = REGISTRY.counter("sap_rerank_degraded_total", "Queries whose re-ranking stopped at the time budget.")
+INDEX_RELOADS = REGISTRY.counter("sap_index_reloads_total", "Background index rebuilds by result.", ("result",))
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def _get_tracer():
+    """OpenTelemetry tracer when OTEL_TRACING is on and the API is installed."""
+    global _tracer
+    if not settings.OTEL_TRACING:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                _tracer = False
+            else:
+                _tracer = trace.get_tracer("sap-support-assistant")
+    return _tracer or None
+
+@contextlib.contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the duration of a pipeline stage (and an OpenTelemetry span, if enabled)."""
+    tracer = _get_tracer()
+    span = tracer.start_as_current_span(stage) if tracer is not None else contextlib.nullcontext()
+    start = time.perf_counter()
+    try:
+        with span:
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+def cache_hit_rates() -> Dict[str, float]:
+    """Hit rate per cache name."""
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in CACHE_LOOKUPS.values().items():
+        hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+        hits_and_total[1] += value
+        if result == "hit":
+            hits_and_total[0] += value
+    return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+def fallback_rate() -> Optional[float]:
+    """Share of searches answered (at least partly) by external search."""
+    values = {key[0]: value for key, value in SEARCH_RESPONSES.values().items()}
+    total = sum(values.values())
+    if not total:
+        return None
+    return (values.get("external", 0.0) + values.get("both", 0.0)) / total
+
+def stage_summary() -> List[Dict[str, float]]:
+    """One row per stage with count and mean/p50/p95 latency in milliseconds, for display."""
+    rows = []
+    for (stage,) in STAGE_SECONDS.label_sets():
+        summary = STAGE_SECONDS.summary(stage=stage)
+        rows.append({"stage": stage, "count": summary["count"],
+                     **{f"{name}_ms": round(summary[name] * 1000, 2) for name in ("mean", "p50", "p95")}})
+    return rows
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_servers: Dict[int, ThreadingHTTPServer] = {}
+_servers_lock = threading.Lock()
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread, for processes without a web API (Streamlit)."""
+    with _servers_lock:
+        server = _servers.get(port)
+        if server is None:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+            _servers[port] = server
+        return server
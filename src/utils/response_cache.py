@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+PURGE_EVERY = 1000  # writes between deletions of expired entries
+
+class ResponseCache:
+    """Persistent key/value cache with TTL, stored in a SQLite file.
+
+    The cache is best effort: a failed read is a miss and a failed write is
+    dropped, both logged, so a locked or corrupt file never fails a lookup.
+    Expired entries are deleted on open and every ``PURGE_EVERY`` writes.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                return None
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning("Response cache read failed for %s: %s", self.path, e)
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time())
+                )
+                self._writes += 1
+                purge = self._writes % PURGE_EVERY == 0
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("Response cache write failed for %s: %s", self.path, e)
+            return
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries. Returns the number removed."""
+        try:
+            with self._lock, self._conn:
+                cursor = self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.warning("Response cache purge failed for %s: %s", self.path, e)
+            return 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,53 @@
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from ..config.settings import settings
+from ..models.search_orchestrator import SearchResponse
+
+if TYPE_CHECKING:
+    import requests
+
+class SearchServiceClient:
+    """Client for the HTTP query service, interchangeable with SearchOrchestrator."""
+
+    def __init__(self, base_url: Optional[str] = None, session: Optional["requests.Session"] = None):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.base_url = (base_url or settings.SEARCH_SERVICE_URL).rstrip("/")
+        self.session = session
+        # The service enforces the latency budget; allow a little on top for transport
+        self.timeout = (settings.SERPAPI_CONNECT_TIMEOUT, settings.SEARCH_LATENCY_BUDGET + 2)
+
+    def search(self, query: str, k: int = 3, threshold: float = 0.65) -> SearchResponse:
+        response = self.session.post(
+            f"{self.base_url}/search",
+            json={"query": query, "k": k, "threshold": threshold},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        body = response.json()
+        return SearchResponse(
+            internal=self._hits(body["internal"]),
+            external=body.get("external", []),
+            source=body["source"],
+            timed_out=body.get("timed_out", False),
+            cached=body.get("cached", False),
+            error=body.get("error")
+        )
+
+    def search_batch(self, queries: List[str], k: int = 3, threshold: float = 0.65) -> List[List[Tuple[str, float]]]:
+        response = self.session.post(
+            f"{self.base_url}/search/batch",
+            json={"queries": queries, "k": k, "threshold": threshold},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return [self._hits(result["internal"]) for result in response.json()["results"]]
+
+    def health(self) -> dict:
+        response = self.session.get(f"{self.base_url}/healthz", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _hits(hits) -> List[Tuple[str, float]]:
+        return [(hit["text"], hit["confidence"]) for hit in hits]
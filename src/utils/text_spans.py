@@ -0,0 +1,18 @@
+"""
+Token spans for passage chunking.
+
+Kept free of pandas and other heavy imports: the embedding model falls back
+to these spans when it has no tokenizer, and is imported by every entry point.
+"""
+
+import re
+from typing import Callable, List, Tuple
+
+# Maps a text to the (start, end) character span of each token
+TokenSpans = Callable[[str], List[Tuple[int, int]]]
+
+_WORD = re.compile(r"\S+")
+
+def word_spans(text: str) -> List[Tuple[int, int]]:
+    """Whitespace tokenization, used when no model tokenizer is available."""
+    return [match.span() for match in _WORD.finditer(text)]
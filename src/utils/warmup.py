@@ -0,0 +1,32 @@
+"""
+Background warm-up for the entry points.
+
+Loading the embedding model and index takes seconds; entry points start it
+here and render (or accept health checks) right away, waiting on the
+returned future only when a query actually needs the components.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+def start_warmup(loader: Callable[[], T], name: str = "warmup") -> "Future[T]":
+    """Run ``loader`` on a daemon thread and return a future for its result.
+
+    A daemon thread (unlike an executor worker) does not hold up interpreter
+    exit if the process stops while still loading.
+    """
+    future: "Future[T]" = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(loader())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True, name=name).start()
+    return future
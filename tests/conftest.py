@@ -0,0 +1,9 @@
+import pytest
+
+from src.config.settings import settings
+
+
+@pytest.fixture(autouse=True)
+def embed_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EMBED_CHECKPOINT_DIR", str(tmp_path / "embed"))
+    return tmp_path / "embed"
@@ -0,0 +1,538 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import HashingEmbedder, make_kb, make_miss_queries, prepare_kb
+from src.config.settings import settings
+from src.models.batching import MicroBatcher
+from src.models.calibration import ScoreCalibrator, expected_calibration_error
+from src.models.embedding_model import EmbeddingModel
+from src.models.index_builder import index_cache_key
+from src.models.lexical_index import BM25Index, extract_note_number, is_exact_token
+from src.models.onnx_backend import parse_model_spec
+from src.models.query_cache import QueryCache, normalize_query
+from src.models.reranker import CrossEncoderReranker
+from src.models.search_engine import SearchEngine
+from src.models.search_orchestrator import SearchOrchestrator
+from src.models.semantic_cache import SemanticCache
+from src.models.sharded_embedder import ShardedEmbedder
+from src.utils.data_loader import diff_kb
+from src.utils.external_search import ExternalSearchError
+
+NOTES = {
+    2345678: "ST22 dump TSV_TNEW_PAGE_ALLOC_FAILED in background job. Increase abap/heap_area_total.",
+    2345679: "Printer 1 output requests stay in waiting status in SP01 spool administration.",
+    2345680: "SAPOSCOL does not start after an upgrade to SLES 7 on the database host.",
+    2345681: "HANA backup fails with log volume full. Free the log area and restart the backup.",
+    2345682: "RFC destination test fails with timeout in SM59 after a gateway restart.",
+}
+
+
+def test_cache_key_changes_with_model_and_backend(tmp_path):
+    kb_path = str(tmp_path / "kb.csv")
+    make_kb(20, seed=14).to_csv(kb_path, index=False)
+    engine = SearchEngine(HashingEmbedder())
+
+    def cache_id(spec):
+        model = object.__new__(EmbeddingModel)  # cache_id only needs the parsed spec, not the model
+        model.model_name, model.backend = parse_model_spec(spec)
+        return model.cache_id
+
+    specs = ["all-MiniLM-L6-v2", "all-MiniLM-L6-v2@onnx", "all-MiniLM-L6-v2@onnx-int8", "all-mpnet-base-v2"]
+    keys = [index_cache_key(engine, kb_path, cache_id(spec)) for spec in specs]
+    assert len(set(keys)) == len(specs)
+    assert index_cache_key(engine, kb_path, cache_id("all-MiniLM-L6-v2@torch")) == keys[0]
+    assert index_cache_key(engine, kb_path, cache_id("all-MiniLM-L6-v2")) == keys[0]
+
+
+@pytest.mark.parametrize("name, value", [("IVF_NLIST", 64), ("PQ_M", 8), ("HNSW_M", 16), ("ANN_TARGET_RECALL", 0.99)])
+def test_cache_key_changes_with_ann_parameters(tmp_path, monkeypatch, name, value):
+    kb_path = str(tmp_path / "kb.csv")
+    make_kb(20, seed=14).to_csv(kb_path, index=False)
+    engine = SearchEngine(HashingEmbedder())
+    key = index_cache_key(engine, kb_path, "model")
+    monkeypatch.setattr(settings, name, value)
+    assert index_cache_key(engine, kb_path, "model") != key
+
+
+def test_sharded_embedder_matches_and_resumes(tmp_path):
+    model = HashingEmbedder()
+    texts = make_kb(250, seed=7)["Description"].tolist()
+    expected = model.encode(texts)
+
+    parallel = ShardedEmbedder(model, workers=2, shard_rows=64, threads=1, checkpoint_dir=str(tmp_path))
+    for start in range(0, len(texts), 100):
+        parallel.add(texts[start:start + 100])
+    np.testing.assert_allclose(parallel.finish(), expected, rtol=1e-6)
+
+    # A rerun finds every finished shard on disk and encodes nothing
+    resumed = ShardedEmbedder(model, workers=1, shard_rows=64, checkpoint_dir=str(tmp_path))
+    resumed.add(texts)
+    np.testing.assert_allclose(resumed.finish(), expected, rtol=1e-6)
+    assert resumed.reused == 4
+    resumed.cleanup()
+    assert not os.path.exists(resumed.checkpoint_dir)
+
+
+class KeywordCrossEncoder:
+    """Scores a pair by whether the passage contains a marker token."""
+
+    def __init__(self, marker, delay=0.0):
+        self.marker, self.delay, self.pairs = marker, delay, 0
+
+    def predict(self, pairs):
+        time.sleep(self.delay * len(pairs))
+        self.pairs += len(pairs)
+        return [1.0 if self.marker in text else 0.0 for _, text in pairs]
+
+
+def test_reranker_reorders_within_budget_and_degrades_to_retrieval_order():
+    kb = make_kb(300, seed=6)
+    engine = SearchEngine(HashingEmbedder())
+    engine.index_kb_batches(prepare_kb(kb, 100))
+    query = kb["Note Title"].iat[0]
+    retrieval = engine.search(query, k=10, threshold=0.0)
+    marker = retrieval[-1][0].split()[-1]  # rare token of the 10th hit
+
+    engine.result_cache = None
+    engine.reranker = CrossEncoderReranker(top_n=10, budget_ms=1000, batch_size=4, model=KeywordCrossEncoder(marker))
+    reranked = engine.search(query, k=3, threshold=0.0)
+    assert reranked[0] == retrieval[-1]
+    assert reranked[1:] == retrieval[:2]
+
+    slow = KeywordCrossEncoder(marker, delay=0.02)
+    engine.reranker = CrossEncoderReranker(top_n=10, budget_ms=50, batch_size=4, model=slow)
+    engine.reranker.warm_up()
+    slow.pairs = 0
+    assert engine.search(query, k=3, threshold=0.0) == retrieval[:3]
+    assert slow.pairs < 10
+
+
+def test_reranker_scores_only_the_top_n_and_keeps_ties_in_retrieval_order():
+    model = KeywordCrossEncoder("ST22")
+    reranker = CrossEncoderReranker(top_n=4, budget_ms=1000, batch_size=3, model=model)
+    texts = ["SM21 log", "ST22 dump", "SP01 spool", "ST22 short dump", "ST22 not scored"]
+    assert reranker.rerank("dump", texts) == [1, 3, 0, 2, 4]
+    assert model.pairs == 4
+    assert CrossEncoderReranker(top_n=4, budget_ms=0, model=model).rerank("dump", texts) == [0, 1, 2, 3, 4]
+
+
+class RecordingEncoder:
+    """Encodes each text as [len(text), batch number] and records batch sizes."""
+
+    def __init__(self, fail=False):
+        self.batches, self.fail = [], fail
+
+    def __call__(self, texts):
+        self.batches.append(len(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return np.array([[len(text), len(self.batches)] for text in texts], dtype="float32")
+
+
+@pytest.fixture
+def batcher():
+    batchers = []
+
+    def make(encoder, **kwargs):
+        batchers.append(MicroBatcher(encoder, **kwargs))
+        return batchers[-1]
+    yield make
+    for micro_batcher in batchers:
+        micro_batcher.close()
+
+
+def test_micro_batcher_merges_concurrent_calls(batcher):
+    encoder = RecordingEncoder()
+    micro_batcher = batcher(encoder, max_wait_ms=200)
+    texts = ["a", "bb", "ccc", "bb", "dddd"]
+    futures = [micro_batcher.submit(text) for text in texts]
+    assert [future.result(timeout=2).tolist() for future in futures] == [
+        [1, 1], [2, 1], [3, 1], [2, 1], [4, 1]]
+    assert encoder.batches == [4]  # one call; the repeated text is encoded once
+    assert micro_batcher.stats()["items"] == 5
+
+
+def test_micro_batcher_caps_batch_size_and_wait(batcher):
+    encoder = RecordingEncoder()
+    micro_batcher = batcher(encoder, max_batch_size=3, max_wait_ms=200)
+    futures = [micro_batcher.submit(str(i)) for i in range(7)]
+    for future in futures:
+        future.result(timeout=2)
+    assert encoder.batches == [3, 3, 1]
+
+    fast = batcher(RecordingEncoder(), max_wait_ms=50)
+    start = time.monotonic()
+    fast.encode("alone")  # waits out the window for company, then runs alone
+    assert 0.04 <= time.monotonic() - start < 0.5
+
+
+def test_micro_batcher_fails_every_caller_of_a_failed_batch(batcher):
+    encoder = RecordingEncoder(fail=True)
+    micro_batcher = batcher(encoder, max_wait_ms=100)
+    futures = [micro_batcher.submit(text) for text in ("a", "b", "c")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            future.result(timeout=2)
+    encoder.fail = False
+    assert micro_batcher.encode("d").tolist() == [1, 2]  # the batcher keeps serving
+
+
+class CountingSearcher:
+    """External searcher stand-in answering after ``delay`` seconds."""
+
+    def __init__(self, delay=0.0):
+        self.calls, self.delay, self.lock = 0, delay, threading.Lock()
+
+    def search_links(self, query, num_results=3):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        return [f"https://example.com/{calls}"]
+
+
+class StubEngine:
+    """Internal search stand-in: fixed answers per query after ``delay`` seconds."""
+
+    def __init__(self, answers, delay=0.0):
+        self.answers, self.delay = answers, delay
+
+    def search(self, query, k=3, threshold=0.65):
+        time.sleep(self.delay)
+        return self.answers.get(query, [])
+
+
+@pytest.fixture
+def orchestrate(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_SIZE", 0)
+    orchestrators = []
+
+    def make(engine, external, policy, budget=2.0, **kwargs):
+        orchestrators.append(SearchOrchestrator(engine, external, policy=policy, latency_budget=budget, **kwargs))
+        return orchestrators[-1]
+    yield make
+    for orchestrator in orchestrators:
+        orchestrator.shutdown()
+
+
+HIT = [("ST22 dump note", 0.9)]
+
+
+def test_sequential_policy_calls_external_only_on_a_miss(orchestrate):
+    external = CountingSearcher()
+    orchestrator = orchestrate(StubEngine({"dump": HIT}), external, "sequential")
+    assert orchestrator.search("dump") == (HIT, [], "internal", False, False, None)
+    assert external.calls == 0
+    response = orchestrator.search("weather")
+    assert response.source == "external" and response.external == ["https://example.com/1"]
+    assert external.calls == 1
+
+
+def test_speculative_policy_answers_a_hit_without_waiting_for_external(orchestrate):
+    external = CountingSearcher(delay=0.5)
+    orchestrator = orchestrate(StubEngine({"dump": HIT}, delay=0.05), external, "speculative")
+    start = time.monotonic()
+    assert orchestrator.search("dump").source == "internal"
+    assert time.monotonic() - start < 0.4
+    response = orchestrator.search("weather")
+    assert response.source == "external" and not response.timed_out
+
+
+def test_always_both_policy_returns_both_sources(orchestrate):
+    orchestrator = orchestrate(StubEngine({"dump": HIT}), CountingSearcher(), "always_both")
+    response = orchestrator.search("dump")
+    assert response.source == "both" and response.internal == HIT and response.external
+
+
+@pytest.mark.parametrize("policy", ["sequential", "speculative", "always_both"])
+def test_slow_sources_are_cut_off_at_the_latency_budget(orchestrate, policy):
+    orchestrator = orchestrate(StubEngine({}, delay=0.05), CountingSearcher(delay=1.0), policy, budget=0.2)
+    start = time.monotonic()
+    response = orchestrator.search("weather")
+    assert time.monotonic() - start < 0.5
+    assert response.timed_out and response.source == "none"
+
+
+class FailingSearcher:
+    def search_links(self, query, num_results=3):
+        raise ExternalSearchError("External search failed: SerpAPI returned HTTP 500")
+
+
+def test_failed_external_search_is_reported_as_an_error(orchestrate):
+    orchestrator = orchestrate(StubEngine({"dump": HIT}), FailingSearcher(), "always_both")
+    assert orchestrator.search("weather") == ([], [], "error", False, False,
+                                              "External search failed: SerpAPI returned HTTP 500")
+    response = orchestrator.search("dump")
+    assert response.source == "internal" and response.error is not None
+
+
+def test_stuck_external_calls_do_not_block_internal_search(orchestrate):
+    external = CountingSearcher(delay=1.0)
+    orchestrator = orchestrate(StubEngine({"dump": HIT}), external, "speculative", budget=0.2,
+                               max_workers=2, external_workers=2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(orchestrator.search, [f"miss {i}" for i in range(8)]))
+    assert external.calls == 2  # the others found no free external worker
+
+    start = time.monotonic()
+    assert orchestrator.search("dump") == (HIT, [], "internal", False, False, None)
+    assert orchestrator.search("another miss").timed_out
+    assert time.monotonic() - start < 0.3
+
+
+def test_semantic_cache_answers_paraphrases_until_the_index_changes():
+    engine = SearchEngine(HashingEmbedder())
+    engine.index_kb_batches(prepare_kb(make_kb(200, seed=8), 100))
+    external = CountingSearcher()
+    orchestrator = SearchOrchestrator(engine, external, policy="sequential", latency_budget=5.0,
+                                      answer_cache=SemanticCache(max_size=2, ttl=0, min_similarity=0.95))
+    query = make_miss_queries(1)[0]
+    paraphrase = " ".join(reversed(query.split()))
+    try:
+        first = orchestrator.search(query)
+        assert first.source == "external" and not first.cached
+        again = orchestrator.search(paraphrase)
+        assert again.cached and again.external == first.external and external.calls == 1
+        # Identifiers must match: same words plus a transaction code is a different question
+        assert not orchestrator.search(f"{query} ST22").cached
+        assert not orchestrator.search(paraphrase, k=5).cached  # evicts the oldest entry
+        assert not orchestrator.search(query).cached
+
+        engine.add([10 ** 6], ["New note about an unrelated topic"])
+        assert not orchestrator.search(query).cached
+        assert orchestrator.answer_cache.stats()["invalidations"] == 1
+    finally:
+        orchestrator.shutdown()
+
+
+def test_semantic_cache_expires_entries_and_matches_extra_key_parts():
+    cache = SemanticCache(max_size=4, ttl=0.05, min_similarity=0.9)
+    vector = np.ones(8, dtype="float32")
+    cache.put("hana backup fails", vector, "answer", 1, 3, 0.65)
+    assert cache.get("backup of hana fails", vector * 2, 1, 3, 0.65) == "answer"
+    assert cache.get("hana backup fails", vector, 1, 5, 0.65) is None
+    time.sleep(0.1)
+    assert cache.get("hana backup fails", vector, 1, 3, 0.65) is None
+    assert len(cache) == 0
+
+
+def test_semantic_cache_evicts_the_least_recently_used_answer():
+    cache = SemanticCache(max_size=2, ttl=0, min_similarity=0.9)
+    vectors = np.eye(3, dtype="float32")
+    cache.put("spool request waiting", vectors[0], "spool", 1)
+    cache.put("hana backup fails", vectors[1], "backup", 1)
+    assert cache.get("spool requests waiting", vectors[0], 1) == "spool"  # now the most recent
+    cache.put("rfc destination timeout", vectors[2], "rfc", 1)
+    assert cache.get("hana backup fails", vectors[1], 1) is None
+    assert [cache.get(query, vector, 1) for query, vector in
+            [("spool request waiting", vectors[0]), ("rfc destination timeout", vectors[2])]] == ["spool", "rfc"]
+    assert {k: cache.stats()[k] for k in ("size", "hits", "misses", "evictions")} == {
+        "size": 2, "hits": 3, "misses": 1, "evictions": 1}
+
+
+@pytest.mark.parametrize("query, normalized", [
+    ("  ST22   Dump ", "st22 dump"),
+    ("SAP Note 0002345678", "sap note 2345678"),
+    ("note #2345678 fails", "sap note 2345678 fails"),
+    ("Note no. 2345678", "sap note 2345678"),
+    ("notes: 123", "sap note 123"),
+    ("printer 1", "printer 1"),
+])
+def test_normalize_query(query, normalized):
+    assert normalize_query(query) == normalized
+
+
+def test_query_cache_is_an_lru_with_ttl():
+    cache = QueryCache(max_size=2, ttl=0.05)
+    cache.put("SAP Note 0002345678", "note", 3)
+    assert cache.get("note #2345678", 3) == "note"
+    assert cache.get("SAP Note 0002345678", 5) is None  # extra key parts must match
+    cache.put("b", "b", 3)
+    cache.get("SAP Note 0002345678", 3)  # now the most recently used
+    cache.put("c", "c", 3)
+    assert cache.get("b", 3) is None and cache.get("c", 3) == "c"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["exact_hits"] == 2 and cache.stats()["normalized_hits"] == 1
+    time.sleep(0.1)
+    assert cache.get("c", 3) is None and len(cache) == 1
+
+
+def test_result_cache_is_dropped_when_the_index_changes():
+    engine = SearchEngine(HashingEmbedder(), result_cache=QueryCache(16))
+    kb = make_kb(100, seed=10)
+    engine.index_kb_batches(prepare_kb(kb, 100))
+    query = kb["Note Title"].iat[0]
+    first = engine.search(query, k=3, threshold=0.0)
+    assert engine.search(f"  {query.upper()} ", k=3, threshold=0.0) == first
+    assert engine.result_cache.stats()["normalized_hits"] == 1
+
+    engine.add([1], [query])
+    assert len(engine.result_cache) == 0
+    assert query in [text for text, _ in engine.search(query, k=3, threshold=0.0)]
+    engine.index_kb_batches(prepare_kb(kb, 100))
+    assert len(engine.result_cache) == 0
+
+
+def test_platt_fit_recovers_a_known_calibration():
+    rng = np.random.default_rng(12)
+    scores = rng.uniform(0.2, 0.9, size=5000)
+    labels = rng.random(5000) < 1.0 / (1.0 + np.exp(-(12.0 * scores - 7.0)))
+    calibrator = ScoreCalibrator.fit(scores, labels)
+    assert calibrator.slope == pytest.approx(12.0, rel=0.15)
+    assert calibrator.intercept == pytest.approx(-7.0, rel=0.15)
+    assert expected_calibration_error(calibrator.confidence(scores), labels) < 0.03
+    assert expected_calibration_error(ScoreCalibrator().confidence(scores), labels) > 0.1
+
+    with pytest.raises(ValueError):
+        ScoreCalibrator.fit(scores, np.ones(5000, dtype=bool))
+    with pytest.raises(ValueError):
+        ScoreCalibrator.fit(scores, ~labels)  # higher scores less relevant
+
+
+def test_calibrations_are_saved_per_setup(tmp_path):
+    path = str(tmp_path / "calibration.json")
+    ScoreCalibrator(10.0, -6.0).save(path, "model|cosine|rule", ece=0.01)
+    ScoreCalibrator(4.0, -2.0).save(path, "other|cosine|rule")
+    loaded = ScoreCalibrator.load(path, "model|cosine|rule")
+    assert (loaded.slope, loaded.intercept) == (10.0, -6.0)
+    assert ScoreCalibrator.load(path, "other|cosine|rule").slope == 4.0
+    assert not ScoreCalibrator.load(path, "missing").fitted
+    assert not ScoreCalibrator.load(str(tmp_path / "none.json"), "model|cosine|rule").fitted
+
+
+def test_threshold_filters_on_calibrated_confidence(monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", False)  # identifier matches may bypass the threshold
+    calibrator = ScoreCalibrator(10.0, -6.0)
+    for confidence in (0.2, 0.5, 0.9):
+        assert calibrator.confidence(calibrator.min_score(confidence)) == pytest.approx(confidence)
+    assert calibrator.min_score(0.0) == -np.inf and calibrator.min_score(1.0) == np.inf
+
+    kb = make_kb(300, seed=13)
+    engine = SearchEngine(HashingEmbedder(), result_cache=QueryCache(0))
+    engine.index_kb_batches(prepare_kb(kb, 100))
+    engine.calibrator = ScoreCalibrator(20.0, -5.0)  # hashing embeddings score lower than a real model
+    queries = kb["Note Title"].tolist()[:20]
+    unfiltered = engine.search_batch(queries, k=10, threshold=0.0)
+    filtered = engine.search_batch(queries, k=10, threshold=0.5)  # similarity >= 0.25
+    assert any(len(hits) < len(all_hits) for hits, all_hits in zip(filtered, unfiltered))
+    assert any(filtered)
+    for hits, all_hits in zip(filtered, unfiltered):
+        assert hits == [hit for hit in all_hits if hit[1] >= 0.5]
+
+
+class SlowEncoder:
+    def encode_single(self, query):
+        time.sleep(1.0)
+        return np.ones(8, dtype="float32")
+
+
+def test_query_encoding_counts_against_the_latency_budget(orchestrate):
+    engine = StubEngine({})
+    engine.embedding_model, engine.generation = SlowEncoder(), 1
+    orchestrator = orchestrate(engine, CountingSearcher(), "speculative", budget=0.2,
+                               answer_cache=SemanticCache(max_size=2))
+    start = time.monotonic()
+    response = orchestrator.search("weather")
+    assert time.monotonic() - start < 0.5
+    assert response.source == "external" and response.timed_out
+    assert len(orchestrator.answer_cache) == 0
+
+
+def test_chunked_notes_are_ranked_once_and_diff_cleanly(monkeypatch):
+    monkeypatch.setattr(settings, "CHUNK_TOKENS", 8)
+    monkeypatch.setattr(settings, "CHUNK_OVERLAP", 2)
+    kb = make_kb(60, seed=9)
+    engine = SearchEngine(HashingEmbedder())
+    engine.index_kb_batches(prepare_kb(kb, 25))
+    assert len(engine.kb_texts) > len(kb)
+
+    results = engine.search(kb["Description"].iat[0], k=5, threshold=0.0)
+    titles = [text.split(". ")[0] for text, _ in results]
+    assert titles[0] == kb["Note Title"].iat[0]
+    assert len(set(titles)) == len(titles)  # one passage per note
+
+    current = pd.concat(prepare_kb(kb, len(kb)))
+    assert diff_kb(engine.snapshot(), current).is_empty
+    edited = kb.copy()
+    edited.loc[edited.index[1], "Description"] += " after the support package upgrade"
+    diff = diff_kb(engine.snapshot(), pd.concat(prepare_kb(edited, len(edited))))
+    assert diff.changed["note_id"].tolist() == [int(kb["Note Number"].iat[1])]
+    engine.apply_diff(diff)
+    assert diff_kb(engine.snapshot(), pd.concat(prepare_kb(edited, len(edited)))).is_empty
+
+
+@pytest.mark.parametrize("token, exact", [
+    ("st22", True), ("/sapapo/om17", True), ("tsv_tnew_page_alloc_failed", True),
+    ("2345678", True), ("1234", True),
+    ("1", False), ("7", False), ("701", False), ("7.53", False), ("printer", False), ("_", False),
+])
+def test_exact_tokens_are_identifiers_only(token, exact):
+    assert is_exact_token(token) == exact
+
+
+def test_note_number_queries():
+    assert extract_note_number("SAP Note 0002345678") == 2345678
+    assert extract_note_number("note #2345678") == 2345678
+    assert extract_note_number("2345678") == 2345678
+    assert extract_note_number("note 2345678 dump in ST22") is None
+    assert extract_note_number("printer 1") is None
+
+
+def test_bm25_ranks_by_term_rarity_and_updates_like_a_rebuild():
+    row_ids, texts = list(range(len(NOTES))), list(NOTES.values())
+    index = BM25Index()
+    index.build(row_ids, texts)
+    found, scores, exact = index.search("ST22 dump in background job", 3)
+    assert found[0] == 0 and exact[0] and list(scores) == sorted(scores, reverse=True)
+    assert len(index.search("nothing matches here", 3)[0]) == 0
+
+    index.delete([1, 3])
+    index.add([7], ["Printer 2 output stuck in SP01"])
+    rebuilt = BM25Index()
+    rebuilt.build([0, 2, 4, 7], [texts[0], texts[2], texts[4], "Printer 2 output stuck in SP01"])
+    for query in ("SP01 printer output", "restart after upgrade", "ST22"):
+        np.testing.assert_array_equal(index.search(query, 4)[0], rebuilt.search(query, 4)[0])
+        np.testing.assert_allclose(index.search(query, 4)[1], rebuilt.search(query, 4)[1], rtol=1e-6)
+
+
+@pytest.fixture
+def hybrid_engine(monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", True)
+    engine = SearchEngine(HashingEmbedder())
+    engine.build_index(list(NOTES.values()), ids=list(NOTES))
+    return engine
+
+
+def test_hybrid_search_keeps_identifier_hits_below_threshold(hybrid_engine):
+    [(text, confidence)] = hybrid_engine.search("ST22", k=3, threshold=0.65)
+    assert text == NOTES[2345678] and confidence < 0.65
+    assert hybrid_engine.search("SAP Note 0002345681", k=3) == [(NOTES[2345681], 1.0)]
+
+
+@pytest.mark.parametrize("query", ["how do I configure printer 1 for invoices", "what is the weather in paris 7"])
+def test_hybrid_search_does_not_treat_short_numbers_as_identifiers(hybrid_engine, query):
+    assert hybrid_engine.search(query, k=3, threshold=0.65) == []
+
+
+def test_reciprocal_rank_fusion_favours_agreement(hybrid_engine):
+    # Dense ranks rows 4, 1, 2; BM25 ranks row 1 first, so row 1 is fused first
+    query = "SP01 spool printer output waiting"
+    query_vec = hybrid_engine.encode_queries([query])[0]
+    similarity = np.array([0.9, 0.8, 0.7], dtype="float32")
+    results = hybrid_engine._hybrid(query, query_vec, similarity, np.array([4, 1, 2]), k=3, threshold=0.0)
+    assert [text for text, _ in results] == [NOTES[2345679], NOTES[2345682], NOTES[2345680]]
+    assert results[0][1] == pytest.approx(0.8)  # confidence of its dense score
+
+
+def test_search_batch_answers_like_search(hybrid_engine):
+    queries = ["SAP Note 2345678", "ST22", "printer 1 output in SP01", "HANA log volume full", "printer 1"]
+    batch = hybrid_engine.search_batch(queries, k=2, threshold=0.3)
+    hybrid_engine.result_cache.clear()
+    assert batch == [hybrid_engine.search(query, k=2, threshold=0.3) for query in queries]
+    assert hybrid_engine.search_batch(queries, k=2, threshold=0.3) == batch  # now from the result cache
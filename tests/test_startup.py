@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = {"torch", "sentence_transformers", "faiss", "pandas"}
+IMPORT_BUDGET_SECONDS = 1.0  # our own modules, on top of the web framework
+
+PROFILE = """
+import json, sys, time
+{preload}
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - started, "modules": sorted(sys.modules)}}))
+"""
+
+
+def import_profile(module, preload=""):
+    """Import ``module`` in a fresh interpreter; return its import time and the modules it loaded."""
+    result = subprocess.run([sys.executable, "-c", PROFILE.format(module=module, preload=preload)],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module, framework", [
+    ("src.server", "fastapi"),
+    ("src.main", "streamlit"),
+    ("app", "streamlit"),
+    ("src.utils.search_client", None),
+    ("src.models.embedding_model", None),
+])
+def test_entry_points_import_within_budget(module, framework):
+    if framework:
+        pytest.importorskip(framework)
+    profile = import_profile(module, preload=f"import {framework}" if framework else "")
+    assert not HEAVY_MODULES & set(profile["modules"])
+    assert profile["seconds"] < IMPORT_BUDGET_SECONDS
+
+
+def test_run_help_skips_heavy_imports():
+    result = subprocess.run([sys.executable, "-X", "importtime", "run.py", "--help"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    assert "usage:" in result.stdout
+    imported = {line.rsplit("|", 1)[-1].strip().split(".")[0] for line in result.stderr.splitlines()}
+    assert not HEAVY_MODULES & imported
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from src.config.settings import settings
+from src.models.index_builder import columnar_kb_path
+from src.utils.data_loader import combine_text, iter_passages, load_kb
+from src.utils.external_search import ExternalSearcher
+from src.utils.metrics import MetricsRegistry
+from src.utils.response_cache import ResponseCache
+
+
+class StubSerpAPI(BaseHTTPRequestHandler):
+    """Local stand-in for SerpAPI; behaviour is driven by the server attributes."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        body = json.dumps({"organic_results": [{"title": "SAP Note 123", "link": "https://example.com/123"}]})
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (timeout test)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSerpAPI)
+    server.daemon_threads = True
+    server.calls, server.delay, server.statuses, server.lock = 0, 0.0, [], threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def searcher(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SERPAPI_BACKOFF", 0.0)
+    monkeypatch.setattr(settings, "SERPAPI_READ_TIMEOUT", 0.5)
+    url = f"http://127.0.0.1:{stub_server.server_address[1]}/search"
+    cache = ResponseCache(str(tmp_path / "serpapi.sqlite"), ttl=60)
+    return ExternalSearcher(api_key="test", base_url=url, cache=cache)
+
+
+def test_external_search_caches_by_normalized_query(searcher, stub_server):
+    assert searcher.search("ST22 dump") == ["SAP Note 123: https://example.com/123"]
+    assert searcher.search("  st22   DUMP ") == ["SAP Note 123: https://example.com/123"]
+    assert stub_server.calls == 1
+
+
+def test_external_search_coalesces_concurrent_queries(searcher, stub_server):
+    stub_server.delay = 0.2
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: searcher.search("hana backup"), range(8)))
+    assert all(r == results[0] for r in results)
+    assert stub_server.calls == 1
+
+
+def test_external_search_retries_server_errors(searcher, stub_server):
+    stub_server.statuses = [503, 503]
+    assert searcher.search("rfc timeout") == ["SAP Note 123: https://example.com/123"]
+    assert stub_server.calls == 3
+
+
+def test_external_search_times_out(searcher, stub_server, monkeypatch):
+    monkeypatch.setattr(settings, "SERPAPI_RETRIES", 0)
+    stub_server.delay = 1.0
+    slow = ExternalSearcher(api_key="test", base_url=searcher.base_url, cache=searcher.cache)
+    start = time.monotonic()
+    assert slow.search("slow query") == ["External search failed: SerpAPI did not answer in time"]
+    assert time.monotonic() - start < 1.0
+
+
+def test_external_search_cache_can_be_turned_off(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SERPAPI_CACHE_PATH", str(tmp_path / "default.sqlite"))
+    url = f"http://127.0.0.1:{stub_server.server_address[1]}/search"
+    assert ExternalSearcher(api_key="test", base_url=url).cache is not None
+    uncached = ExternalSearcher(api_key="test", base_url=url, cache=False)
+    assert uncached.cache is None
+    assert uncached.search("ST22 dump") == uncached.search("ST22 dump")
+    assert stub_server.calls == 2
+
+
+def test_external_search_survives_a_broken_response_cache(searcher, stub_server):
+    searcher.cache.close()  # every read and write now raises sqlite3.ProgrammingError
+    assert searcher.search("hana backup") == ["SAP Note 123: https://example.com/123"]
+    assert stub_server.calls == 1
+
+
+def test_response_cache_purges_expired_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / "serpapi.sqlite")
+    cache = ResponseCache(path, ttl=0.05)
+    cache.put("old", ["link"])
+    time.sleep(0.1)
+    assert cache.get("old") is None
+    cache.close()
+    reopened = ResponseCache(path, ttl=0.05)  # purges on open
+    assert reopened.purge_expired() == 0
+
+    monkeypatch.setattr("src.utils.response_cache.PURGE_EVERY", 3)
+    reopened.put("a", 1)
+    reopened.put("b", 2)
+    time.sleep(0.1)
+    reopened.put("c", 3)  # third write: a and b are deleted
+    assert reopened.purge_expired() == 0
+    reopened.close()
+
+
+KB_ROWS = [
+    ["ST22 dump in background job", "Increase abap/heap_area_total.", 2345678],
+    [404, "Numeric title cell from a spreadsheet.", 2345679],
+    ["HANA backup fails", 7.53, 2345680],
+    ["Row without a description", None, 2345681],
+]
+
+
+def write_kb(path):
+    frame = pd.DataFrame(KB_ROWS, columns=["Note Title", "Description", "Note Number"])
+    if path.suffix == ".xlsx":
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(list(frame.columns) + ["Ignored"])
+        for row in KB_ROWS:
+            sheet.append(row + ["x"])
+        workbook.save(path)
+    elif path.suffix == ".csv":
+        frame.to_csv(path, index=False)
+    else:
+        frame.astype({"Note Title": "string", "Description": "string"}).to_parquet(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("name", ["kb.xlsx", "kb.csv", "kb.parquet"])
+def test_load_kb_reads_every_format_as_text(tmp_path, name):
+    pytest.importorskip("openpyxl" if name.endswith(".xlsx") else "pyarrow")
+    kb = load_kb(write_kb(tmp_path / name))
+    assert kb["note_id"].tolist() == [2345678, 2345679, 2345680]
+    assert kb["combined_text"].tolist() == [
+        "ST22 dump in background job. Increase abap/heap_area_total.",
+        "404. Numeric title cell from a spreadsheet.",
+        "HANA backup fails. 7.53",
+    ]
+
+
+def test_combine_text_coerces_cells():
+    frame = pd.DataFrame({"Note Title": [1, None], "Description": ["text", 2.5]}, dtype=object)
+    assert combine_text(frame).tolist() == ["1. text", ". 2.5"]
+
+
+def test_excel_kb_is_converted_once_and_old_copies_removed(tmp_path, monkeypatch):
+    pytest.importorskip("openpyxl")
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(settings, "KB_BATCH_ROWS", 2)
+    kb_path = write_kb(tmp_path / "kb.xlsx")
+    cache_dir = str(tmp_path / "kb_cache")
+    copy = columnar_kb_path(kb_path, cache_dir)
+    assert copy.endswith(".parquet") and columnar_kb_path(kb_path, cache_dir) == copy
+    other_copy = columnar_kb_path(write_kb(tmp_path / "other.xlsx"), cache_dir)
+    assert other_copy != copy
+    columns = ["combined_text", "note_id", "content_hash"]
+    pd.testing.assert_frame_equal(load_kb(copy)[columns], load_kb(kb_path)[columns])
+
+    KB_ROWS.append(["RFC timeout in SM59", "Check the gateway.", 2345682])
+    try:
+        new_copy = columnar_kb_path(write_kb(tmp_path / "kb.xlsx"), cache_dir)
+    finally:
+        KB_ROWS.pop()
+    # The old copy of this KB is removed; the other KB's copy is not
+    assert new_copy != copy and sorted(os.listdir(cache_dir)) == sorted(map(os.path.basename, [new_copy, other_copy]))
+    assert len(load_kb(new_copy)) == 4
+
+
+def test_passages_overlap_and_keep_the_title():
+    words = " ".join(f"w{i}" for i in range(10))
+    notes = [(1, "Short", "fits in one passage"), (2, "Long", words)]
+    assert list(iter_passages(notes, max_tokens=4, overlap=1)) == [
+        (1, 0, "Short. fits in one passage"),
+        (2, 0, "Long. w0 w1 w2 w3"),
+        (2, 1, "Long. w3 w4 w5 w6"),
+        (2, 2, "Long. w6 w7 w8 w9"),
+    ]
+    assert list(iter_passages(notes[1:], max_tokens=0)) == [(2, 0, f"Long. {words}")]
+
+
+def test_metrics_render_prometheus_text():
+    registry = MetricsRegistry()
+    lookups = registry.counter("lookups_total", "Lookups.", ("cache",))
+    latency = registry.histogram("stage_seconds", "Latency.", ("stage",), buckets=(0.01, 0.1))
+    lookups.inc(cache="query")
+    lookups.inc(2, cache="query")
+    for value in (0.005, 0.05, 0.5):
+        latency.observe(value, stage="search")
+    text = registry.render()
+    assert 'lookups_total{cache="query"} 3.0' in text
+    assert 'stage_seconds_bucket{stage="search",le="0.01"} 1' in text
+    assert 'stage_seconds_bucket{stage="search",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="search"} 3' in text
+    assert latency.summary(stage="search")["count"] == 3
+    with pytest.raises(ValueError):
+        lookups.inc(stage="search")